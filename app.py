@@ -12,12 +12,15 @@ sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
 # Import functions from src package
 try:
-    from src import perform_operation, perform_all_operations, get_user_input, extract_info_from_ollama, generate_response_from_ollama
+    from src import perform_operation, perform_all_operations, perform_multi_region_operation, get_user_input, extract_info_from_ollama, generate_response_from_ollama
+    from src.preview import get_refinement
 except ImportError as e:
     print(f"ImportError: {e}")
     IMPORT_ERROR_OCCURRED = True
+    get_refinement = None
     perform_operation = None
     perform_all_operations = None
+    perform_multi_region_operation = None
     get_user_input = None
     extract_info_from_ollama = None
     generate_response_from_ollama = None
@@ -28,6 +31,22 @@ app = Flask(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def is_multi_region(location):
+    """A location selects a multi-region query when it is a list or asks for every known region."""
+    if isinstance(location, list):
+        return True
+    return isinstance(location, str) and location.strip().lower() in ["all", "all oceans", "all regions"]
+
+def json_safe(value):
+    """Replace NaN values with None so results serialise to valid JSON."""
+    if isinstance(value, dict):
+        return {k: json_safe(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [json_safe(v) for v in value]
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
 @app.route('/', methods=['GET'])
 def index():
     return render_template('index.html')
@@ -62,14 +81,14 @@ def predict():
                 if not operation:
                     logger.warning("Operation not extracted by extract_info_from_ollama. Attempting fallback extraction.")
                     query_lower = query.lower()
-                    valid_operations = ["mean", "median", "variance", "max", "min", "range", "deviation", "all"]
+                    valid_operations = ["mean", "median", "variance", "max", "min", "range", "deviation", "anomaly", "zscore", "all"]
                     for op in valid_operations:
                         if op in query_lower:
                             operation = op
                             logger.info(f"Fallback operation extracted: {operation}")
                             break
                     if not operation:
-                        error_message = "Could not determine the operation from the query. Please specify an operation like mean, median, variance, max, min, range, deviation, or all."
+                        error_message = "Could not determine the operation from the query. Please specify an operation like mean, median, variance, max, min, range, deviation, anomaly, zscore, or all."
                         logger.error(f"Operation extraction failed: {error_message}")
                         return render_template('output.html', analysis_result=None, trend_graph=None, spatial_graph=None, error=error_message, original_query=query, explanation=None)
 
@@ -79,7 +98,34 @@ def predict():
                 return render_template('output.html', analysis_result=None, trend_graph=None, spatial_graph=None, error=error_message, original_query=query, explanation=None)
 
             if perform_operation:
-                if operation in ["mean", "median", "variance", "max", "min", "range", "deviation"]:
+                if is_multi_region(location) and operation in ["mean", "median", "variance", "max", "min", "range", "deviation"]:
+                    regions = location if isinstance(location, list) else None
+                    computation_result = perform_multi_region_operation(operation, parameter, time_range, regions)
+                    logger.info(f"Multi-region result: {computation_result}")
+
+                    if isinstance(computation_result, dict):
+                        analysis_result_parts = []
+                        unit = computation_result.get('unit', '')
+                        for region_name, res_data in computation_result['regions'].items():
+                            if "value" in res_data:
+                                value = res_data['value']
+                                display_value = "NaN" if np.isnan(value) else f"{value:.6f}"
+                                analysis_result_parts.append(f"{region_name.title()}: {display_value} {unit}".strip())
+                                if trend_visualization_html is None:
+                                    trend_visualization_html = res_data.get('trend_graph')
+                                if spatial_visualization_html is None:
+                                    spatial_visualization_html = res_data.get('spatial_graph')
+                            else:
+                                analysis_result_parts.append(f"{region_name.title()}: Error - {res_data['error']}")
+                        analysis_result = (
+                            f"The {operation} {parameter.replace('_', ' ')} from {time_range[0]} to {time_range[1]}:<br>"
+                            + "<br>".join(analysis_result_parts)
+                        )
+                    else:
+                        error_message = str(computation_result)
+                elif is_multi_region(location):
+                    error_message = f"The {operation} operation covers one location at a time. Ask about a single region, or use mean, median, variance, max, min, range or deviation for several regions."
+                elif operation in ["mean", "median", "variance", "max", "min", "range", "deviation", "anomaly", "zscore"]:
                     try:
                         computation_result = perform_operation(operation, parameter, time_range, location)
                         logger.info(f"Operation result: {computation_result}")
@@ -171,7 +217,7 @@ def predict():
                     else:
                         analysis_result = "All operations failed."
                 else:
-                    error_message = "Unsupported operation. Please choose mean, median, variance, max, min, range, deviation, or all."
+                    error_message = "Unsupported operation. Please choose mean, median, variance, max, min, range, deviation, anomaly, zscore, or all."
             else:
                 error_message = "Import error occurred. Cannot perform operation."
 
@@ -200,6 +246,89 @@ def predict():
                            original_query=query,
                            explanation=explanation)
 
+@app.route('/predict_regions', methods=['POST'])
+def predict_regions():
+    """
+    JSON API for multi-region queries computed in one pass over the tiles.
+    Body: {"operation", "parameter", "time_range": [start, end],
+           "regions": [names, {"name", "lon_min", "lon_max", "lat_min", "lat_max"}
+                       or {"name", "geometry": GeoJSON polygon}],
+           "area_weighted": weight means by cos(latitude),
+           "include_spatial": return per-region spatial maps (default true),
+           "include_graphs": also return plotly graphs (default false)}
+    Omitting "regions" selects every known location.
+    """
+    payload = request.get_json(silent=True) or {}
+    logger.info(f"Received multi-region request: {payload}")
+
+    if perform_multi_region_operation is None:
+        return jsonify({"error": "Import error occurred. Cannot perform operation."}), 500
+
+    operation = payload.get("operation")
+    parameter = payload.get("parameter")
+    time_range = payload.get("time_range")
+    if not operation or not parameter or not isinstance(time_range, list) or len(time_range) < 2:
+        return jsonify({"error": "operation, parameter and time_range [start, end] are required."}), 400
+
+    include_graphs = bool(payload.get("include_graphs", False))
+    include_spatial = bool(payload.get("include_spatial", True))
+    try:
+        result = perform_multi_region_operation(operation, parameter, time_range[:2], payload.get("regions"),
+                                                with_spatial=include_spatial, with_graphs=include_graphs,
+                                                area_weighted=bool(payload.get("area_weighted", False)))
+    except Exception as e:
+        logger.error(f"Multi-region computation error: {str(e)}")
+        return jsonify({"error": f"Error during computation: {str(e)}"}), 500
+
+    if not isinstance(result, dict):
+        return jsonify({"error": result}), 400
+
+    return jsonify(json_safe(result))
+
+@app.route('/preview', methods=['POST'])
+def preview():
+    """
+    Quick-look JSON API: an approximate value and map from decimated, day-sampled
+    data with an error estimate. Unless "refine" is false, the exact result is
+    computed in the background; poll /preview/<refinement_id> for it.
+    Body: {"operation", "parameter", "time_range": [start, end], "location", "refine",
+           "area_weighted": weight means by cos(latitude)}
+    """
+    payload = request.get_json(silent=True) or {}
+    logger.info(f"Received preview request: {payload}")
+
+    if perform_operation is None:
+        return jsonify({"error": "Import error occurred. Cannot perform operation."}), 500
+
+    operation = payload.get("operation")
+    parameter = payload.get("parameter")
+    time_range = payload.get("time_range")
+    if not operation or not parameter or not isinstance(time_range, list) or len(time_range) < 2:
+        return jsonify({"error": "operation, parameter and time_range [start, end] are required."}), 400
+
+    try:
+        result = perform_operation(operation, parameter, time_range[:2], payload.get("location"),
+                                   preview=True, refine=bool(payload.get("refine", True)),
+                                   area_weighted=bool(payload.get("area_weighted", False)))
+    except Exception as e:
+        logger.error(f"Preview computation error: {str(e)}")
+        return jsonify({"error": f"Error during computation: {str(e)}"}), 500
+
+    if not isinstance(result, dict):
+        return jsonify({"error": result}), 400
+    return jsonify(json_safe(result))
+
+@app.route('/preview/<job_id>', methods=['GET'])
+def preview_refinement(job_id):
+    """Status of a background refinement; includes the exact result once done."""
+    if get_refinement is None:
+        return jsonify({"error": "Import error occurred. Cannot perform operation."}), 500
+
+    record = get_refinement(job_id)
+    if record["status"] == "unknown":
+        return jsonify(record), 404
+    return jsonify(json_safe(record))
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
 
@@ -0,0 +1,54 @@
+import os
+import sys
+import logging
+import multiprocessing
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from gunicorn.app.base import BaseApplication
+
+from app import app
+from src.tile_cache import TILE_CACHE_DIR, TILE_CACHE_MAX_BYTES
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class NicesGeoServer(BaseApplication):
+    """
+    Production entry point: a pre-forked gunicorn server around the Flask app.
+    The app is loaded once in the master and forked into the workers, and all
+    workers share the tile cache in TILE_CACHE_DIR, so a hot tile is decoded
+    once per host rather than once per worker.
+    """
+
+    def __init__(self, application, options=None):
+        self.application = application
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key.lower(), value)
+
+    def load(self):
+        return self.application
+
+
+def default_workers():
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+if __name__ == '__main__':
+    options = {
+        "bind": os.environ.get("NICES_BIND", "0.0.0.0:5000"),
+        "workers": int(os.environ.get("NICES_WORKERS", default_workers())),
+        "timeout": int(os.environ.get("NICES_TIMEOUT", "600")),
+        "preload_app": True,
+    }
+    logger.info(f"Starting {options['workers']} workers on {options['bind']}")
+    logger.info(f"Shared tile cache: {TILE_CACHE_DIR} ({TILE_CACHE_MAX_BYTES // (1024 * 1024)} MB cap)")
+    NicesGeoServer(app, options).run()
@@ -2,7 +2,7 @@
 
 # Import all necessary functions from your modules
 from .main import get_user_input, extract_info_from_ollama, generate_response_from_ollama
-from .compute import perform_operation, perform_all_operations, SUPPORTED_OPERATIONS, DATASET_PATHS, LOCATION_COORDS, compute_statistic  # Import compute_statistic
+from .compute import perform_operation, perform_all_operations, perform_multi_region_operation, SUPPORTED_OPERATIONS, DATASET_PATHS, LOCATION_COORDS, compute_statistic  # Import compute_statistic
 
 # Import other utilities defined in __init__.py
 import re
@@ -19,6 +19,7 @@ from io import BytesIO
 __all__ = [
     'perform_operation',
     'perform_all_operations',
+    'perform_multi_region_operation',
     'get_user_input',
     'extract_info_from_ollama',
     'generate_response_from_ollama'
@@ -0,0 +1,261 @@
+import os
+import sys
+import csv
+import json
+import math
+import time
+import argparse
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .main import extract_info_from_ollama
+from .compute import perform_operation, perform_region_operations, get_region, SUPPORTED_OPERATIONS, CLIMATOLOGY_OPERATIONS, ALL_OPERATIONS
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Fields written for every query, in CSV column order
+RESULT_FIELDS = ["id", "query", "operation", "parameter", "start_date", "end_date", "location",
+                 "value", "unit", "error", "extract_seconds", "compute_seconds", "total_seconds", "shared_with"]
+
+# Operations a batch query can ask for; "trend" has no scalar value and
+# "all" expands into ALL_OPERATIONS
+BATCH_OPERATIONS = [op for op in SUPPORTED_OPERATIONS if op != "trend"] + ["all"]
+
+
+def load_queries(path):
+    """
+    Read queries from a file, one per line. A line is either plain natural
+    language or a JSON object with a natural-language "query" (or "body") or
+    structured "operation", "parameter", "time_range" and "location" fields.
+    An "id" (or "request_id") is kept; otherwise the line number is used.
+    """
+    queries = []
+    with open(path) as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = line
+            if isinstance(entry, str):
+                entry = {"query": entry}
+            if not isinstance(entry, dict):
+                logger.warning(f"Skipping line {line_no}: not a query")
+                continue
+            entry.setdefault("id", entry.get("request_id", str(line_no)))
+            if "query" not in entry and "body" in entry:
+                entry["query"] = entry["body"]
+            queries.append(entry)
+    return queries
+
+
+def resolve_query(entry):
+    """
+    Fill in operation, parameter, time_range and location, asking Ollama for
+    natural-language queries that lack structured fields.
+    Returns a result record (without a value yet).
+    """
+    record = {field: None for field in RESULT_FIELDS}
+    record["id"] = entry["id"]
+    record["query"] = entry.get("query")
+    record["extract_seconds"] = 0.0
+
+    fields = {key: entry.get(key) for key in ("operation", "parameter", "time_range", "location")}
+    if not (fields["operation"] and fields["parameter"] and fields["time_range"]) and entry.get("query"):
+        started = time.perf_counter()
+        extracted = extract_info_from_ollama(entry["query"])
+        record["extract_seconds"] = round(time.perf_counter() - started, 3)
+        if "error" in extracted:
+            record["error"] = extracted["error"]
+            return record
+        for key in fields:
+            fields[key] = fields[key] or extracted.get(key)
+
+    if not fields["operation"] or not fields["parameter"]:
+        record["error"] = "Could not determine the operation and parameter."
+        return record
+    if not isinstance(fields["time_range"], list) or len(fields["time_range"]) < 2:
+        record["error"] = "Invalid time range. Please specify both start and end dates."
+        return record
+
+    record["operation"] = str(fields["operation"]).lower()
+    record["parameter"] = str(fields["parameter"]).lower()
+    record["start_date"], record["end_date"] = fields["time_range"][:2]
+    record["location"] = str(fields["location"]).lower() if fields["location"] else None
+    if record["operation"] not in BATCH_OPERATIONS:
+        record["error"] = f"Unsupported operation: '{record['operation']}'. Choose one of {', '.join(BATCH_OPERATIONS)}."
+        return record
+    return record
+
+
+def expand_operations(record):
+    """Split an "all" query into one record per operation in ALL_OPERATIONS; other records pass through."""
+    if record["operation"] != "all":
+        return [record]
+    return [dict(record, operation=operation) for operation in ALL_OPERATIONS]
+
+
+def group_queries(records):
+    """
+    Group resolved queries by parameter and date range so each group reads its
+    tiles once: every operation over the group's known locations is computed
+    from a single stacked read of their union window.
+    """
+    groups = {}
+    for record in records:
+        key = (record["parameter"], record["start_date"], record["end_date"])
+        groups.setdefault(key, []).append(record)
+    return groups
+
+
+def run_group(records):
+    """Compute every query in a group, sharing one read between them. Returns the completed records."""
+    # Global queries, unknown locations and climatology operations run on their
+    # own so they cannot fail the shared pass
+    shared, single = [], []
+    for record in records:
+        known = record["location"] and get_region(record["location"]) is not None
+        (shared if known and record["operation"] not in CLIMATOLOGY_OPERATIONS else single).append(record)
+
+    if len(shared) > 1:
+        _run_shared(shared)
+    else:
+        single += shared
+    for record in single:
+        _run_single(record)
+    return records
+
+
+def _run_single(record):
+    started = time.perf_counter()
+    try:
+        result = perform_operation(record["operation"], record["parameter"],
+                                   [record["start_date"], record["end_date"]], record["location"],
+                                   with_trend=False, with_spatial=False)
+    except Exception as e:
+        result = f"Error during computation: {e}"
+    record["compute_seconds"] = round(time.perf_counter() - started, 3)
+    record["shared_with"] = 1
+    _store_result(record, result)
+
+
+def _run_shared(records):
+    operations = list(dict.fromkeys(r["operation"] for r in records))
+    locations = sorted({r["location"] for r in records})
+    started = time.perf_counter()
+    try:
+        result = perform_region_operations(operations, records[0]["parameter"],
+                                           [records[0]["start_date"], records[0]["end_date"]], locations)
+    except Exception as e:
+        result = f"Error during computation: {e}"
+    elapsed = round(time.perf_counter() - started, 3)
+
+    for record in records:
+        record["compute_seconds"] = elapsed
+        record["shared_with"] = len(records)
+        if not isinstance(result, dict):
+            _store_result(record, result)
+        else:
+            region_result = result["results"][record["operation"]].get(record["location"], {"error": "Region missing from result."})
+            _store_result(record, dict(region_result, unit=result["unit"]))
+
+
+def _json_value(value):
+    """NaN becomes None so JSONL output stays valid JSON and CSV cells stay empty."""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _store_result(record, result):
+    if isinstance(result, dict) and "value" in result:
+        record["value"] = result["value"]
+        record["unit"] = result.get("unit", "")
+    elif isinstance(result, dict):
+        record["error"] = result.get("error", str(result))
+    else:
+        record["error"] = str(result)
+
+
+class ResultWriter:
+    """Thread-safe streaming writer for JSONL or CSV results."""
+
+    def __init__(self, path, fmt=None):
+        self.fmt = fmt or ("csv" if path.endswith(".csv") else "jsonl")
+        self._lock = threading.Lock()
+        self._file = sys.stdout if path == "-" else open(path, "w", newline="")
+        self._csv = None
+        if self.fmt == "csv":
+            self._csv = csv.DictWriter(self._file, fieldnames=RESULT_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, record):
+        record = {key: _json_value(value) for key, value in record.items()}
+        with self._lock:
+            if self._csv:
+                self._csv.writerow(record)
+            else:
+                self._file.write(json.dumps(record, default=str, allow_nan=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+def run_batch(queries, writer, workers=4):
+    """
+    Resolve, group and compute queries with a bounded worker pool, streaming
+    each finished group's records to the writer. "all" queries expand into one
+    record per operation. Returns the number of records that produced a value.
+    """
+    batch_started = time.perf_counter()
+    succeeded = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        records = [expanded for record in pool.map(resolve_query, queries) for expanded in expand_operations(record)]
+        for record in records:
+            if record["error"]:
+                record["total_seconds"] = record["extract_seconds"]
+                writer.write(record)
+
+        groups = group_queries([r for r in records if not r["error"]])
+        logger.info(f"Running {sum(len(g) for g in groups.values())} queries in {len(groups)} groups on {workers} workers")
+        futures = [pool.submit(run_group, group) for group in groups.values()]
+        for future in as_completed(futures):
+            for record in future.result():
+                record["total_seconds"] = round(record["extract_seconds"] + (record["compute_seconds"] or 0.0), 3)
+                succeeded += record["error"] is None
+                writer.write(record)
+
+    logger.info(f"Batch finished: {succeeded}/{len(records)} results in {time.perf_counter() - batch_started:.1f}s")
+    return succeeded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a file of queries concurrently with shared tile reads.")
+    parser.add_argument("queries", help="Query file: natural-language lines or JSONL")
+    parser.add_argument("-o", "--output", default="-", help="Output file (.jsonl or .csv); '-' for stdout")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Output format (default: from the file extension)")
+    parser.add_argument("-w", "--workers", type=int, default=min(8, os.cpu_count() or 1),
+                        help="Maximum concurrent query groups")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    queries = load_queries(args.queries)
+    if not queries:
+        logger.error(f"No queries found in {args.queries}")
+        return 1
+
+    writer = ResultWriter(args.output, args.format)
+    try:
+        run_batch(queries, writer, workers=max(1, args.workers))
+    finally:
+        writer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import argparse
+import datetime
+import logging
+import numpy as np
+import rasterio
+from rasterio.transform import Affine
+from .tiles import read_band
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Number of baseline periods per year for each climatology kind
+CLIMATOLOGY_PERIODS = {
+    "doy": 366,   # Day of year, on a leap-year calendar so 29 Feb has its own slot
+    "month": 12
+}
+
+# Pixels whose baseline period has data from fewer years than this are left
+# out of anomaly and z-score queries; a mean and std from one or two years
+# are not a meaningful baseline.
+MIN_BASELINE_YEARS = int(os.environ.get("NICES_CLIMATOLOGY_MIN_YEARS", "3"))
+
+
+def period_index(date, by="doy"):
+    """Index of the climatology period a date falls in."""
+    if by == "month":
+        return date.month - 1
+    return datetime.date(2000, date.month, date.day).timetuple().tm_yday - 1
+
+
+def build_climatology(dated_files, out_dir, by="doy"):
+    """
+    Compute per-pixel climatology means and standard deviations from an archive.
+    Nodata, band masks and scale/offset metadata are honoured when reading.
+    dated_files is a list of (date, path). Files are grouped by period and each
+    period is accumulated in float64 on its own, so memory stays at a few grids.
+    Writes mean.npy, std.npy and count.npy shaped (periods, rows, cols) plus
+    meta.json to out_dir and returns the metadata. count holds the number of
+    distinct years with valid data for each pixel and period.
+    """
+    if by not in CLIMATOLOGY_PERIODS:
+        raise ValueError(f"Unknown climatology kind: {by}")
+    if not dated_files:
+        raise ValueError("No files to build a climatology from")
+
+    groups = {}
+    for date, path in dated_files:
+        groups.setdefault(period_index(date, by), []).append((date.year, path))
+
+    with rasterio.open(dated_files[0][1]) as src:
+        transform, width, height = src.transform, src.width, src.height
+
+    os.makedirs(out_dir, exist_ok=True)
+    shape = (CLIMATOLOGY_PERIODS[by], height, width)
+    mean_out = np.lib.format.open_memmap(os.path.join(out_dir, "mean.npy"), mode="w+", dtype=np.float32, shape=shape)
+    std_out = np.lib.format.open_memmap(os.path.join(out_dir, "std.npy"), mode="w+", dtype=np.float32, shape=shape)
+    count_out = np.lib.format.open_memmap(os.path.join(out_dir, "count.npy"), mode="w+", dtype=np.uint16, shape=shape)
+    mean_out[:] = np.nan
+    std_out[:] = np.nan
+    count_out[:] = 0
+
+    for index in sorted(groups):
+        total = np.zeros((height, width), dtype=np.float64)
+        total_sq = np.zeros((height, width), dtype=np.float64)
+        count = np.zeros((height, width), dtype=np.uint16)
+        years = np.zeros((height, width), dtype=np.uint16)
+        year_valid = {}
+
+        for year, path in groups[index]:
+            try:
+                with rasterio.open(path) as src:
+                    if (src.transform, src.width, src.height) != (transform, width, height):
+                        logger.warning(f"Grid of {os.path.basename(path)} differs from the archive. Skipping.")
+                        continue
+                    tile = read_band(src)
+            except Exception as e:
+                logger.error(f"Failed reading {path}: {e}")
+                continue
+            valid = ~np.ma.getmaskarray(tile)
+            data = np.ma.getdata(tile).astype(np.float64)
+            data[~valid] = 0.0
+            total += data
+            total_sq += data * data
+            count += valid
+            if year in year_valid:
+                year_valid[year] |= valid
+            else:
+                year_valid[year] = valid
+
+        for valid in year_valid.values():
+            years += valid
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+            variance = np.maximum(total_sq / count - mean * mean, 0.0)
+        mean_out[index] = mean
+        std_out[index] = np.sqrt(variance)
+        count_out[index] = years
+        logger.info(f"Climatology period {index + 1}/{shape[0]}: {len(groups[index])} files")
+
+    for array in (mean_out, std_out, count_out):
+        array.flush()
+
+    years = sorted({date.year for date, _ in dated_files})
+    meta = {
+        "by": by,
+        "start_year": years[0],
+        "end_year": years[-1],
+        "files": len(dated_files),
+        "transform": list(transform)[:6],
+        "width": width,
+        "height": height,
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=4)
+    logger.info(f"Wrote {by} climatology for {years[0]}-{years[-1]} to {out_dir}")
+    return meta
+
+
+def load_climatology(out_dir):
+    """
+    Open a stored climatology. The mean, std and count arrays are
+    memory-mapped, so queries only touch the periods and windows they need.
+    Returns None if no climatology has been built.
+    """
+    meta_path = os.path.join(out_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    meta["transform"] = Affine(*meta["transform"])
+    meta["mean"] = np.load(os.path.join(out_dir, "mean.npy"), mmap_mode="r")
+    meta["std"] = np.load(os.path.join(out_dir, "std.npy"), mmap_mode="r")
+    meta["count"] = np.load(os.path.join(out_dir, "count.npy"), mmap_mode="r")
+    return meta
+
+
+def baseline_window(climatology, statistic, date, plan):
+    """Baseline mean, std or count for a date, cut to a region plan's stitched window."""
+    grid = climatology[statistic][period_index(date, climatology["by"])]
+    rows = grid[plan["row_start"]:plan["row_end"]]
+    parts = [rows[:, c0:c1] for c0, c1 in plan["col_windows"]]
+    return parts[0] if len(parts) == 1 else np.concatenate(parts, axis=1)
+
+
+def main(argv=None):
+    from src.compute import find_matching_files, get_climatology_dir, get_file_date
+
+    parser = argparse.ArgumentParser(description="Build a per-pixel climatology baseline for a parameter.")
+    parser.add_argument("parameter", help="Parameter name, e.g. 'water vapour'")
+    parser.add_argument("start_year", type=int)
+    parser.add_argument("end_year", type=int)
+    parser.add_argument("--by", choices=sorted(CLIMATOLOGY_PERIODS), default="doy",
+                        help="Baseline period: day of year or month")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    files = find_matching_files(args.parameter,
+                                datetime.datetime(args.start_year, 1, 1),
+                                datetime.datetime(args.end_year, 12, 31))
+    if isinstance(files, str):
+        logger.error(files)
+        return 1
+
+    build_climatology([(get_file_date(f), f) for f in files], get_climatology_dir(args.parameter), by=args.by)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
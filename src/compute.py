@@ -1,11 +1,20 @@
 import os
 import datetime
+import functools
+import math
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 import rasterio
 from rasterio.warp import transform as rio_transform
 import logging
+import warnings
+from .regions import load_region_geometries, get_region_plan, get_union_plan, plan_slices, read_plan_window, row_block_plan, area_weights
+from .climatology import load_climatology, baseline_window, MIN_BASELINE_YEARS
+from .tiles import ACCUMULATOR_DTYPE, band_scaling, make_tile, valid_count, tile_to_float, stack_tiles
+from .preview import PREVIEW_MAX_SIDE, PREVIEW_MAX_DAYS, sample_files, read_preview_tile, bootstrap_error, extreme_shortfall, start_refinement
+from .planner import IN_MEMORY, STREAMING, AdmissionError, plan_query, admitted
+from .tile_cache import tile_cache_enabled, tile_cache_key, get_cached_tile, put_cached_tile
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -19,9 +28,21 @@ SUPPORTED_OPERATIONS = {
     "max": "max",
     "min": "min",
     "range": "range",
-    "deviation": "deviation"
+    "deviation": "deviation",
+    "anomaly": "anomaly",
+    "zscore": "zscore"
 }
 
+# Operations measured against the stored climatology baseline
+CLIMATOLOGY_OPERATIONS = ["anomaly", "zscore"]
+
+# Operations covered by an "all" request
+ALL_OPERATIONS = [op for op in SUPPORTED_OPERATIONS if op != "trend" and op not in CLIMATOLOGY_OPERATIONS]
+
+# The spatial median is taken over this many row blocks of the cube, as
+# nanmedian sorts a masked copy with int64 indices of whatever it is given
+MEDIAN_ROW_BLOCKS = 16
+
 # Dataset path
 DATASET_PATHS = "/home/arya/Desktop/datasets"
 
@@ -41,6 +62,9 @@ LOCATION_COORDS = {
     },
 }
 
+# Named polygon regions, rasterized on demand
+REGION_POLYGONS = load_region_geometries()
+
 # Dataset mapping parameters to their respective units
 PARAMETER_UNITS = {
     "ocean currents": "m/s",          # Ocean currents in meters 
@@ -51,6 +75,17 @@ def get_parameter_dir(parameter):
     parameter = parameter.lower().replace(" ", "_")
     return os.path.join(DATASET_PATHS, parameter)
 
+def get_climatology_dir(parameter):
+    return os.path.join(DATASET_PATHS, "climatology", parameter.lower().replace(" ", "_"))
+
+def get_file_date(filename):
+    """
+    Parse the acquisition date from a '<name>_YYYYMMDD.tif' filename.
+    Raises ValueError if the filename does not carry a date.
+    """
+    date_part = os.path.basename(filename).split("_")[-1].replace(".tif", "")
+    return datetime.datetime.strptime(date_part, "%Y%m%d")
+
 def get_required_tif_files(parameter, year, start_date, end_date):
     """
     Get TIF files for a parameter within a date range.
@@ -66,9 +101,8 @@ def get_required_tif_files(parameter, year, start_date, end_date):
     
     for filename in all_files:
         if filename.endswith(".tif"):
-            date_part = filename.split("_")[-1].replace(".tif", "")
             try:
-                file_date = datetime.datetime.strptime(date_part, "%Y%m%d")
+                file_date = get_file_date(filename)
                 if start_date <= file_date <= end_date:
                     selected_files.append(os.path.join(year_dir, filename))
             except ValueError:
@@ -78,73 +112,83 @@ def get_required_tif_files(parameter, year, start_date, end_date):
     logger.info(f"Selected {len(selected_files)} files for time range {start_date} to {end_date}")
     return selected_files
 
-def read_geotiff_files(matching_files, location=None):
+def get_region(location):
     """
-    Read and crop GeoTIFF files based on location coordinates.
-    Returns cropped data, latitude grid, and longitude grid.
+    Region spec for a named location: a bounding box from LOCATION_COORDS or a
+    polygon from regions.geojson. Returns None for unknown names.
+    """
+    if not location:
+        return None
+    location = location.lower()
+    return LOCATION_COORDS.get(location) or REGION_POLYGONS.get(location)
+
+def known_locations():
+    return list(LOCATION_COORDS) + [name for name in REGION_POLYGONS if name not in LOCATION_COORDS]
+
+def read_planned_tile(file, make_plan, apply_mask=True):
+    """
+    Read only the window a region needs from a GeoTIFF.
+    make_plan(transform, width, height) returns the cached region plan for the
+    file's grid; regions crossing the antimeridian are read as two windows and
+    stitched. The result is a masked tile in the band's native dtype: nodata,
+    band-mask and NaN pixels are masked, as are pixels outside the region when
+    apply_mask is set, and scale/offset metadata is applied.
+    Raw windows and their validity masks are kept in the shared tile cache so
+    every worker process maps the same arrays instead of re-reading the GeoTIFF.
+    Returns (tile, plan), or None if the region has no pixels on the grid.
+    """
+    with rasterio.open(file) as src:
+        plan = make_plan(src.transform, src.width, src.height)
+        if plan is None:
+            return None
+        scale, offset = band_scaling(src)
+
+        key = tile_cache_key(file, plan["key"]) if tile_cache_enabled() else None
+        data = get_cached_tile(key) if key else None
+        invalid = get_cached_tile(f"{key}-mask") if data is not None else None
+        if data is None or invalid is None:
+            data, invalid = read_plan_window(src, plan)
+            if key:
+                data = put_cached_tile(key, data)
+                invalid = put_cached_tile(f"{key}-mask", invalid)
+
+    if apply_mask and not plan["mask"].all():
+        invalid = invalid | ~plan["mask"]
+    return make_tile(data, invalid, scale, offset), plan
+
+def read_tiles(matching_files, make_plan, read_tile=read_planned_tile):
+    """
+    Read every file with read_tile(file, make_plan), skipping unreadable and
+    empty tiles. Returns the tiles, their file dates, latitude axis and
+    longitude axis, or (None, None, None, None) if nothing valid was found.
     """
     cropped_data_list = []
+    dates = []
     cropped_lat_grid = None
     cropped_lon_grid = None
-    location = location.lower() if location else None
-
-    if location and location in LOCATION_COORDS:
-        bounds = LOCATION_COORDS[location]
-        lon_min, lon_max = bounds["lon_min"], bounds["lon_max"]
-        lat_min, lat_max = bounds["lat_min"], bounds["lat_max"]
-    else:
-        bounds = None
 
     for file in sorted(matching_files):
         try:
-            with rasterio.open(file) as src:
-                data = src.read(1)
-                transform = src.transform
-                rows, cols = data.shape
-
-                # Generate coordinate grids
-                col_indices, row_indices = np.meshgrid(np.arange(cols), np.arange(rows))
-                lons, lats = transform * (col_indices, row_indices)
-
-                test1 = np.nanmax(lons)
-                logger.debug(f"Cropped data shape: {test1}")
-                if bounds:
-                    # Create mask for the bounding box
-                    mask = (lons >= lon_min) & (lons <= lon_max) & (lats >= lat_min) & (lats <= lat_max)
-                    if not np.any(mask):
-                        logger.warning(f"No data within bounds for {os.path.basename(file)}. Skipping.")
-                        continue
-
-                    # Find indices for cropping
-                    row_mask = np.any(mask, axis=1)
-                    col_mask = np.any(mask, axis=0)
-                    row_start = np.argmax(row_mask)
-                    row_end = len(row_mask) - np.argmax(row_mask[::-1])
-                    col_start = np.argmax(col_mask)
-                    col_end = len(col_mask) - np.argmax(col_mask[::-1])
-
-                    # Crop data and grids
-                    cropped_data = data[row_start:row_end, col_start:col_end]
-                    cropped_lats = lats[row_start:row_end, col_start:col_end]
-                    cropped_lons = lons[row_start:row_end, col_start:col_end]
-                else:
-                    cropped_data = data
-                    cropped_lats = lats
-                    cropped_lons = lons
-
-                if np.sum(~np.isnan(cropped_data)) == 0:
-                    logger.warning(f"Cropped data for {os.path.basename(file)} contains all NaN values. Skipping.")
-                    continue
-
-                cropped_data_list.append(cropped_data)
-                if cropped_lat_grid is None:
-                    cropped_lat_grid = cropped_lats
-                    cropped_lon_grid = cropped_lons
-
-                # Verify consistency of grid shapes
-                if cropped_data.shape != cropped_data_list[0].shape:
-                    logger.error(f"Inconsistent shapes in cropped data for {file}")
-                    return None, None, None
+            cropped = read_tile(file, make_plan)
+            if cropped is None:
+                logger.warning(f"No data within bounds for {os.path.basename(file)}. Skipping.")
+                continue
+            cropped_data, plan = cropped
+
+            if valid_count(cropped_data) == 0:
+                logger.warning(f"Cropped data for {os.path.basename(file)} contains all NaN values. Skipping.")
+                continue
+
+            cropped_data_list.append(cropped_data)
+            dates.append(get_file_date(file))
+            if cropped_lat_grid is None:
+                cropped_lat_grid = plan["lats"]
+                cropped_lon_grid = plan["lons"]
+
+            # Verify consistency of grid shapes
+            if cropped_data.shape != cropped_data_list[0].shape:
+                logger.error(f"Inconsistent shapes in cropped data for {file}")
+                return None, None, None, None
 
         except Exception as e:
             logger.error(f"Failed reading {file}: {e}")
@@ -152,9 +196,56 @@ def read_geotiff_files(matching_files, location=None):
 
     if not cropped_data_list:
         logger.warning("No valid cropped data found in any of the files")
-        return None, None, None
+        return None, None, None, None
+
+    return cropped_data_list, dates, cropped_lat_grid, cropped_lon_grid
 
-    return cropped_data_list, cropped_lat_grid, cropped_lon_grid
+def read_geotiff_files(matching_files, location=None):
+    """
+    Read and crop GeoTIFF files based on location coordinates.
+    Returns cropped data, latitude axis, and longitude axis.
+    """
+    cropped_data, _, lat_grid, lon_grid = read_tiles(matching_files, functools.partial(get_region_plan, get_region(location)))
+    return cropped_data, lat_grid, lon_grid
+
+def anomaly_reader(parameter, operation):
+    """
+    Tile reader for anomaly operations: reads a tile like read_planned_tile and
+    subtracts the stored climatology mean for the file's date; for "zscore"
+    also divides by the climatology std. Pixels whose baseline has fewer than
+    MIN_BASELINE_YEARS years of data are left out. Only the matching baseline
+    window is read. Returns read_tile(file, make_plan) -> (anomaly, plan), or an error
+    message if no baseline has been built.
+    """
+    climatology = load_climatology(get_climatology_dir(parameter))
+    if climatology is None:
+        logger.error(f"No climatology baseline for {parameter}")
+        return f"No climatology baseline for '{parameter}'. Build one with: python -m src.climatology \"{parameter}\" START_YEAR END_YEAR"
+
+    baseline_grid = (climatology["transform"], climatology["width"], climatology["height"])
+    logger.info(f"Computing {operation} against the {climatology['start_year']}-{climatology['end_year']} {climatology['by']} baseline")
+
+    def read_tile(file, make_plan):
+        def checked_plan(transform, width, height):
+            if (transform, width, height) != baseline_grid:
+                raise ValueError("Grid does not match the climatology baseline")
+            return make_plan(transform, width, height)
+
+        planned = read_planned_tile(file, checked_plan)
+        if planned is None:
+            return None
+        tile, plan = planned
+        date = get_file_date(file)
+
+        anomaly = tile_to_float(tile) - baseline_window(climatology, "mean", date, plan)
+        anomaly[baseline_window(climatology, "count", date, plan) < MIN_BASELINE_YEARS] = np.nan
+        if operation == "zscore":
+            std = baseline_window(climatology, "std", date, plan)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                anomaly = np.where(std > 0, anomaly / std, np.nan)
+        return anomaly, plan
+
+    return read_tile
 
 def calculate_daily_statistic(data, operation):
     if np.all(np.isnan(data)):
@@ -170,7 +261,7 @@ def calculate_daily_statistic(data, operation):
     
     try:
         if operation == "mean":
-            return np.nanmean(data)
+            return np.nanmean(data, dtype=ACCUMULATOR_DTYPE)
         elif operation == "median":
             return np.nanmedian(data)
         elif operation == "max":
@@ -178,11 +269,11 @@ def calculate_daily_statistic(data, operation):
         elif operation == "min":
             return np.nanmin(data)
         elif operation == "variance":
-            return np.nanvar(data)
+            return np.nanvar(data, dtype=ACCUMULATOR_DTYPE)
         elif operation == "range":
             return np.nanmax(data) - np.nanmin(data)
         elif operation == "deviation":
-            return np.nanstd(data)
+            return np.nanstd(data, dtype=ACCUMULATOR_DTYPE)
         else:
             logger.error(f"Unknown operation: {operation}")
             return np.nan
@@ -197,19 +288,21 @@ def calculate_spatial_statistic(stacked_data, operation):
         
     try:
         if operation == "mean":
-            result = np.nanmean(stacked_data, axis=0)
+            result = np.nanmean(stacked_data, axis=0, dtype=ACCUMULATOR_DTYPE)
         elif operation == "median":
-            result = np.nanmedian(stacked_data, axis=0)
+            step = math.ceil(stacked_data.shape[1] / MEDIAN_ROW_BLOCKS)
+            result = np.concatenate([np.nanmedian(stacked_data[:, r:r + step], axis=0)
+                                     for r in range(0, stacked_data.shape[1], step)], axis=0)
         elif operation == "max":
             result = np.nanmax(stacked_data, axis=0)
         elif operation == "min":
             result = np.nanmin(stacked_data, axis=0)
         elif operation == "variance":
-            result = np.nanvar(stacked_data, axis=0)
+            result = np.nanvar(stacked_data, axis=0, dtype=ACCUMULATOR_DTYPE)
         elif operation == "range":
             result = np.nanmax(stacked_data, axis=0) - np.nanmin(stacked_data, axis=0)
         elif operation == "deviation":
-            result = np.nanstd(stacked_data, axis=0)
+            result = np.nanstd(stacked_data, axis=0, dtype=ACCUMULATOR_DTYPE)
         else:
             logger.error(f"Unknown operation: {operation}")
             return None
@@ -228,7 +321,7 @@ def calculate_scalar_statistic(stacked_data, operation):
         
     try:
         if operation == "mean":
-            result = float(np.nanmean(stacked_data))
+            result = float(np.nanmean(stacked_data, dtype=ACCUMULATOR_DTYPE))
         elif operation == "median":
             result = float(np.nanmedian(stacked_data))
         elif operation == "max":
@@ -236,11 +329,11 @@ def calculate_scalar_statistic(stacked_data, operation):
         elif operation == "min":
             result = float(np.nanmin(stacked_data))
         elif operation == "variance":
-            result = float(np.nanvar(stacked_data))
+            result = float(np.nanvar(stacked_data, dtype=ACCUMULATOR_DTYPE))
         elif operation == "range":
             result = float(np.nanmax(stacked_data) - np.nanmin(stacked_data))
         elif operation == "deviation":
-            result = float(np.nanstd(stacked_data))
+            result = float(np.nanstd(stacked_data, dtype=ACCUMULATOR_DTYPE))
         else:
             logger.error(f"Unknown operation: {operation}")
             return np.nan
@@ -251,38 +344,91 @@ def calculate_scalar_statistic(stacked_data, operation):
         logger.error(f"Error calculating scalar {operation}: {e}")
         return np.nan
 
-def compute_statistic(cropped_data, operation, return_daily=False, return_spatial=False):
+def calculate_statistic_along(data, operation, axis=None):
+    """
+    NaN-aware statistic over the given axis (or axes) in a single vectorized call.
+    All-NaN slices yield NaN instead of raising warnings.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        if operation == "mean":
+            return np.nanmean(data, axis=axis, dtype=ACCUMULATOR_DTYPE)
+        elif operation == "median":
+            return np.nanmedian(data, axis=axis)
+        elif operation == "max":
+            return np.nanmax(data, axis=axis)
+        elif operation == "min":
+            return np.nanmin(data, axis=axis)
+        elif operation == "variance":
+            return np.nanvar(data, axis=axis, dtype=ACCUMULATOR_DTYPE)
+        elif operation == "range":
+            return np.nanmax(data, axis=axis) - np.nanmin(data, axis=axis)
+        elif operation == "deviation":
+            return np.nanstd(data, axis=axis, dtype=ACCUMULATOR_DTYPE)
+    raise ValueError(f"Unknown operation: {operation}")
+
+def weighted_nanmean(data, weights, axis=None):
+    """
+    Area-weighted mean ignoring NaNs, for weights that vary only by row
+    (e.g. cos(latitude), shape (rows, 1)). axis is None for a single value or
+    (1, 2) for one value per day. Rows are summed first so the weights are
+    never broadcast over the full cube.
+    """
+    row_sums = np.nansum(data, axis=-1, dtype=ACCUMULATOR_DTYPE)
+    row_counts = np.sum(~np.isnan(data), axis=-1)
+    weights = np.ravel(weights)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if axis is None:
+            return np.sum(row_sums * weights) / np.sum(row_counts * weights)
+        return np.sum(row_sums * weights, axis=-1) / np.sum(row_counts * weights, axis=-1)
+
+def compute_statistic(cropped_data, operation, return_daily=False, return_spatial=False, weights=None, dates=None, consume=False):
     """
-    Compute statistic from cropped data.
+    Compute statistic from cropped data: a list of tiles or an already
+    stacked cube. With consume, the caller hands over the tile list, which is
+    emptied so each tile is freed as soon as it is stacked; otherwise the
+    list is left untouched. dates holds each tile's date for the daily series;
+    without it days are numbered. With row weights (e.g. cos(latitude)),
+    means are area-weighted.
     """
-    all_data = []
+    valid_data = []
+    valid_dates = []
     daily_values = []
-    dates = []
+    if dates is None:
+        dates = list(range(len(cropped_data)))
     logger.info(f"Processing {len(cropped_data)} cropped data arrays for {operation} calculation")
-    
-    for i, data in enumerate(cropped_data):
-        if np.sum(~np.isnan(data)) == 0:
-            logger.warning(f"Cropped data index {i} contains all NaN values. Skipping.")
-            continue
-        
-        all_data.append(data)
-        if return_daily:
-            daily_value = calculate_daily_statistic(data, operation)
+
+    if isinstance(cropped_data, np.ndarray):
+        stacked = cropped_data
+        valid_dates = list(dates)
+    else:
+        for i, data in enumerate(cropped_data):
+            if valid_count(data) == 0:
+                logger.warning(f"Cropped data index {i} contains all NaN values. Skipping.")
+                continue
+            valid_data.append(data)
+            valid_dates.append(dates[i])
+        if consume:
+            # Drop the caller's references so stacking can free each tile as it goes
+            cropped_data.clear()
+
+        if not valid_data:
+            logger.warning("No valid data found in cropped arrays")
+            return "No valid data found."
+
+        logger.debug(f"Stacking {len(valid_data)} valid data arrays")
+        # Compact tiles are decoded straight into a float32 cube where the source allows it
+        stacked = stack_tiles(valid_data)
+    logger.debug(f"Stacked shape: {stacked.shape}, dtype: {stacked.dtype}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"NaN percentage: {np.isnan(stacked).sum() / stacked.size * 100:.2f}%")
+
+    weighted = weights is not None and operation == "mean"
+    if return_daily:
+        for day in stacked:
+            daily_value = float(weighted_nanmean(day, weights)) if weighted else calculate_daily_statistic(day, operation)
             logger.debug(f"Daily {operation}: {daily_value}")
             daily_values.append(daily_value)
-            # Placeholder for date; adjust as needed
-            date = datetime.datetime.now()
-            dates.append(date)
-
-    if not all_data:
-        logger.warning("No valid data found in cropped arrays")
-        return "No valid data found."
-
-    logger.debug(f"Stacking {len(all_data)} valid data arrays")
-    stacked = np.stack(all_data)
-    logger.debug(f"Stacked shape: {stacked.shape}")
-    logger.debug(f"Contains NaN: {np.isnan(stacked).any()}")
-    logger.debug(f"NaN percentage: {np.isnan(stacked).sum() / stacked.size * 100:.2f}%")
     
     spatial_result = None
     if return_spatial:
@@ -291,15 +437,301 @@ def compute_statistic(cropped_data, operation, return_daily=False, return_spatia
             logger.debug(f"Spatial result shape: {spatial_result.shape}")
             logger.debug(f"Spatial result NaN percentage: {np.isnan(spatial_result).sum() / spatial_result.size * 100:.2f}%")
     
-    scalar_result = calculate_scalar_statistic(stacked, operation)
+    if weighted:
+        scalar_result = float(weighted_nanmean(stacked, weights))
+    else:
+        scalar_result = calculate_scalar_statistic(stacked, operation)
     logger.info(f"Final scalar {operation} result: {scalar_result}")
 
     return {
         "scalar": scalar_result,
-        "trend": (dates, daily_values) if return_daily else None,
+        "trend": (valid_dates, daily_values) if return_daily else None,
         "spatial": spatial_result
     }
 
+def _spatial_from_accumulators(operation, count, mean, m2, high, low):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if operation == "mean":
+            return np.where(count > 0, mean, np.nan)
+        elif operation == "variance":
+            return np.where(count > 0, m2 / count, np.nan)
+        elif operation == "deviation":
+            return np.sqrt(np.where(count > 0, m2 / count, np.nan))
+        elif operation == "max":
+            return high
+        elif operation == "min":
+            return low
+        elif operation == "range":
+            return high - low
+    logger.error(f"Unknown operation: {operation}")
+    return None
+
+def _scalar_from_summary(operation, total, mean, m2, high, low):
+    if total == 0:
+        return np.nan
+    if operation == "mean":
+        return float(mean)
+    elif operation == "variance":
+        return float(m2 / total)
+    elif operation == "deviation":
+        return float(np.sqrt(m2 / total))
+    elif operation == "max":
+        return float(high)
+    elif operation == "min":
+        return float(low)
+    elif operation == "range":
+        return float(high - low)
+    logger.error(f"Unknown operation: {operation}")
+    return np.nan
+
+def _merge_pixel_summaries(count, mean, m2):
+    """Combine per-pixel (count, mean, M2) into one (total, mean, M2) with Chan's formula."""
+    total = int(count.sum())
+    if total == 0:
+        return 0, np.nan, np.nan
+    weighted = np.where(count > 0, mean, 0.0)
+    grand_mean = float(np.sum(count * weighted) / total)
+    grand_m2 = float(np.sum(m2) + np.sum(count * (weighted - grand_mean) ** 2))
+    return total, grand_mean, grand_m2
+
+def compute_statistic_streaming(matching_files, make_plan, operation, read_tile=read_planned_tile, return_daily=False, return_spatial=False, area_weighted=False):
+    """
+    Compute a statistic holding one tile at a time. Per-pixel count, mean and
+    M2 (Welford) plus running max/min are accumulated in float64 and merged
+    at the end, so memory is independent of the number of days. Not usable
+    for the median.
+    Returns (result, latitude axis, longitude axis) like compute_statistic.
+    """
+    count = mean = m2 = high = low = weights = None
+    lat_grid = lon_grid = None
+    daily_values = []
+    dates = []
+    logger.info(f"Streaming {len(matching_files)} files for {operation} calculation")
+
+    for file in sorted(matching_files):
+        try:
+            read = read_tile(file, make_plan)
+        except Exception as e:
+            logger.error(f"Failed reading {file}: {e}")
+            continue
+        if read is None or valid_count(read[0]) == 0:
+            logger.warning(f"No valid data for {os.path.basename(file)}. Skipping.")
+            continue
+        values = tile_to_float(read[0])
+
+        if count is None:
+            count = np.zeros(values.shape, dtype=np.int32)
+            mean = np.zeros(values.shape, dtype=ACCUMULATOR_DTYPE)
+            m2 = np.zeros(values.shape, dtype=ACCUMULATOR_DTYPE)
+            high = np.full(values.shape, np.nan, dtype=ACCUMULATOR_DTYPE)
+            low = np.full(values.shape, np.nan, dtype=ACCUMULATOR_DTYPE)
+            lat_grid, lon_grid = read[1]["lats"], read[1]["lons"]
+            if area_weighted and operation == "mean":
+                weights = read[1]["area_weights"]
+        elif values.shape != count.shape:
+            logger.error(f"Inconsistent shapes in cropped data for {file}")
+            return "Inconsistent grids in data files.", None, None
+
+        valid = ~np.isnan(values)
+        count += valid
+        delta = np.where(valid, values - mean, 0.0)
+        mean += delta / np.maximum(count, 1)
+        m2 += np.where(valid, delta * (values - mean), 0.0)
+        np.fmax(high, values, out=high)
+        np.fmin(low, values, out=low)
+
+        if return_daily:
+            if weights is not None:
+                daily_values.append(float(weighted_nanmean(values, weights)))
+            else:
+                daily_values.append(calculate_daily_statistic(values, operation))
+            dates.append(get_file_date(file))
+
+    if count is None:
+        logger.warning("No valid data found in any of the files")
+        return "No valid data found.", None, None
+
+    total, grand_mean, grand_m2 = _merge_pixel_summaries(count, mean, m2)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        scalar_result = _scalar_from_summary(operation, total, grand_mean, grand_m2, np.nanmax(high), np.nanmin(low))
+    if weights is not None:
+        weighted_counts = count * weights
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scalar_result = float(np.sum(weighted_counts * np.where(count > 0, mean, 0.0)) / np.sum(weighted_counts))
+    logger.info(f"Final scalar {operation} result: {scalar_result}")
+
+    return {
+        "scalar": scalar_result,
+        "trend": (dates, daily_values) if return_daily else None,
+        "spatial": _spatial_from_accumulators(operation, count, mean, m2, high, low) if return_spatial else None
+    }, lat_grid, lon_grid
+
+def _approximate_median(histogram, edges):
+    """Median from a value histogram, interpolated within the median bin."""
+    cumulative = np.cumsum(histogram)
+    total = cumulative[-1]
+    if total == 0:
+        return np.nan
+    target = total / 2.0
+    i = int(np.searchsorted(cumulative, target))
+    before = cumulative[i - 1] if i > 0 else 0
+    fraction = (target - before) / histogram[i] if histogram[i] else 0.0
+    return float(edges[i] + fraction * (edges[i + 1] - edges[i]))
+
+def compute_statistic_partitioned(matching_files, make_plan, operation, partitions, read_tile=read_planned_tile, return_daily=False, return_spatial=False, median_bins=65536, area_weighted=False):
+    """
+    Compute a statistic over horizontal row blocks of the region, stacking
+    only one block of every day at a time. Spatial results are exact; the
+    scalar merges per-block summaries (Chan's formula), except the median,
+    which takes a second pass building a value histogram and is accurate to
+    (max - min) / median_bins. Daily values need whole days, so they are
+    computed in a separate pass holding one tile at a time.
+    Returns (result, latitude axis, longitude axis) like compute_statistic.
+    """
+    files = sorted(matching_files)
+    with rasterio.open(files[0]) as src:
+        plan = make_plan(src.transform, src.width, src.height)
+    if plan is None:
+        return "No valid cropped data found.", None, None
+
+    rows, cols = plan["mask"].shape
+    edges = np.unique(np.linspace(0, rows, partitions + 1).astype(int))
+    blocks = list(zip(edges[:-1], edges[1:]))
+    logger.info(f"Processing {len(files)} files for {operation} in {len(blocks)} row blocks")
+
+    def block_plan(row_start, row_end):
+        return lambda transform, width, height: row_block_plan(make_plan(transform, width, height), row_start, row_end)
+
+    weighted = area_weighted and operation == "mean"
+    spatial_blocks = []
+    total, grand_mean, grand_m2 = 0, 0.0, 0.0
+    weighted_sum, weighted_count = 0.0, 0.0
+    high, low = np.nan, np.nan
+    for row_start, row_end in blocks:
+        tiles = read_tiles(files, block_plan(row_start, row_end), read_tile)[0]
+        if tiles is None:
+            if return_spatial:
+                spatial_blocks.append(np.full((row_end - row_start, cols), np.nan))
+            continue
+        cube = stack_tiles(tiles)
+        del tiles
+
+        if return_spatial:
+            spatial = calculate_spatial_statistic(cube, operation)
+            spatial_blocks.append(spatial if spatial is not None else np.full((row_end - row_start, cols), np.nan))
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            n = int(np.sum(~np.isnan(cube)))
+            if n:
+                block_mean = float(np.nanmean(cube, dtype=ACCUMULATOR_DTYPE))
+                block_m2 = float(np.nanvar(cube, dtype=ACCUMULATOR_DTYPE)) * n if operation != "median" else 0.0
+                delta = block_mean - grand_mean
+                combined = total + n
+                grand_m2 += block_m2 + delta * delta * total * n / combined
+                grand_mean += delta * n / combined
+                total = combined
+                high = np.fmax(high, np.nanmax(cube))
+                low = np.fmin(low, np.nanmin(cube))
+                if weighted:
+                    block_weights = np.ravel(plan["area_weights"][row_start:row_end])
+                    weighted_sum += float(np.sum(np.nansum(cube, axis=(0, 2), dtype=ACCUMULATOR_DTYPE) * block_weights))
+                    weighted_count += float(np.sum(np.sum(~np.isnan(cube), axis=(0, 2)) * block_weights))
+        del cube
+
+    if total == 0:
+        logger.warning("No valid data found in any of the files")
+        return "No valid data found.", None, None
+
+    if operation == "median" and high == low:
+        scalar_result = float(low)
+    elif operation == "median":
+        histogram = np.zeros(median_bins, dtype=np.int64)
+        bin_edges = np.linspace(low, high, median_bins + 1)
+        for row_start, row_end in blocks:
+            tiles = read_tiles(files, block_plan(row_start, row_end), read_tile)[0]
+            if tiles is None:
+                continue
+            cube = stack_tiles(tiles)
+            del tiles
+            histogram += np.histogram(cube[~np.isnan(cube)], bins=bin_edges)[0]
+            del cube
+        scalar_result = _approximate_median(histogram, bin_edges)
+    elif weighted:
+        scalar_result = weighted_sum / weighted_count if weighted_count else np.nan
+    else:
+        scalar_result = _scalar_from_summary(operation, total, grand_mean, grand_m2, high, low)
+    logger.info(f"Final scalar {operation} result: {scalar_result}")
+
+    daily_values = []
+    dates = []
+    if return_daily:
+        for file in files:
+            try:
+                read = read_tile(file, make_plan)
+            except Exception as e:
+                logger.error(f"Failed reading {file}: {e}")
+                continue
+            if read is None or valid_count(read[0]) == 0:
+                continue
+            if weighted:
+                daily_values.append(float(weighted_nanmean(tile_to_float(read[0]), plan["area_weights"])))
+            else:
+                daily_values.append(calculate_daily_statistic(tile_to_float(read[0]), operation))
+            dates.append(get_file_date(file))
+
+    return {
+        "scalar": scalar_result,
+        "trend": (dates, daily_values) if return_daily else None,
+        "spatial": np.concatenate(spatial_blocks, axis=0) if return_spatial else None
+    }, plan["lats"], plan["lons"]
+
+def execute_query(matching_files, make_plan, operation, read_tile=read_planned_tile, return_daily=False, return_spatial=False, label="", area_weighted=False):
+    """
+    Plan a query from the file headers, wait for the server-wide memory
+    budget to admit it, then run it with the chosen strategy: an in-memory
+    stack, a streaming pass or a partitioned pass. With area_weighted, means
+    are weighted by cos(latitude).
+    Returns (result, latitude axis, longitude axis) or an error message.
+    """
+    try:
+        estimate = plan_query(matching_files, make_plan, operation, with_spatial=return_spatial)
+    except Exception as e:
+        logger.error(f"Could not plan query: {e}")
+        return f"Could not read data files: {e}"
+    if estimate is None:
+        return "No valid cropped data found."
+    if estimate["strategy"] is None:
+        logger.error(f"Query too large to plan: {estimate}")
+        return (f"Query too large: it needs about {estimate['in_memory_bytes'] / (1024 * 1024):.0f} MB even when "
+                f"partitioned. Narrow the region or time range.")
+
+    try:
+        with admitted(estimate["peak_bytes"], label):
+            if estimate["strategy"] == IN_MEMORY:
+                cropped_data, dates, lat_grid, lon_grid = read_tiles(matching_files, make_plan, read_tile)
+                if cropped_data is None:
+                    return "No valid cropped data found."
+                result = compute_statistic(cropped_data, operation, return_daily=return_daily, return_spatial=return_spatial,
+                                           weights=area_weights(lat_grid) if area_weighted else None, dates=dates,
+                                           consume=True)
+            elif estimate["strategy"] == STREAMING:
+                result, lat_grid, lon_grid = compute_statistic_streaming(
+                    matching_files, make_plan, operation, read_tile, return_daily=return_daily, return_spatial=return_spatial,
+                    area_weighted=area_weighted)
+            else:
+                result, lat_grid, lon_grid = compute_statistic_partitioned(
+                    matching_files, make_plan, operation, estimate["partitions"], read_tile,
+                    return_daily=return_daily, return_spatial=return_spatial, area_weighted=area_weighted)
+    except AdmissionError as e:
+        logger.warning(f"Query not admitted: {e}")
+        return str(e)
+
+    if isinstance(result, str):
+        return result
+    return result, lat_grid, lon_grid
+
 def plot_trend(dates, values, operation, title=None):
     if not dates or not values or len(dates) != len(values):
         logger.warning(f"Invalid data for trend plot. Dates: {len(dates)}, Values: {len(values)}")
@@ -325,17 +757,17 @@ def plot_trend(dates, values, operation, title=None):
     )
     return fig.to_html(full_html=False)
 
-def plot_spatial_raster(raster_data, lat_grid, lon_grid, title="Spatial Plot"):
+def plot_spatial_raster(raster_data, lats, lons, title="Spatial Plot"):
     """
-    Plot spatial raster with coordinate grids.
+    Plot spatial raster with 1-D latitude and longitude axes.
     """
     if raster_data is None or np.all(np.isnan(raster_data)):
         logger.warning("No valid data for spatial plot")
         return None
         
     fig = px.imshow(raster_data, 
-                    x=lon_grid[0, :], 
-                    y=lat_grid[:, 0], 
+                    x=lons, 
+                    y=lats, 
                     origin="lower",  # Changed from "upper" to "lower"
                     color_continuous_scale="Viridis",
                     labels={"color": "Value"}, 
@@ -348,11 +780,11 @@ def plot_spatial_raster(raster_data, lat_grid, lon_grid, title="Spatial Plot"):
     )
     return fig.to_html(full_html=False)
 
-def perform_operation(operation, parameter, time_range, location=None, with_trend=True, with_spatial=True):
-    logger.info(f"===== PERFORMING {operation.upper()} ON {parameter.upper()} =====")
-    logger.info(f"Time range: {time_range[0]} to {time_range[1]}")
-    logger.info(f"Location: {location or 'global'}")
-    
+def resolve_time_range(time_range):
+    """
+    Validate a ["YYYY-MM-DD", "YYYY-MM-DD"] time range.
+    Returns (start_date, end_date) or an error message.
+    """
     def is_valid_date(date_str):
         try:
             datetime.datetime.strptime(date_str, "%Y-%m-%d")
@@ -371,23 +803,21 @@ def perform_operation(operation, parameter, time_range, location=None, with_tren
         logger.error("Start date is after end date")
         return "Invalid date range: Start date is after end date."
 
-    location = location.lower() if location else location
-
-    if location and location not in LOCATION_COORDS:
-        logger.error(f"Invalid location: '{location}'")
-        return f"Invalid location: '{location}'"
+    return start_date, end_date
 
+def find_matching_files(parameter, start_date, end_date):
+    """
+    Collect the TIF files for a parameter across every year of the date range.
+    Returns the list of files or an error message.
+    """
     param_dir = get_parameter_dir(parameter)
     logger.debug(f"Parameter directory: {param_dir}")
     if not os.path.exists(param_dir):
         logger.error(f"Parameter directory not found")
         return f"Parameter '{parameter}' not found."
 
-    start_year = start_date.year
-    end_year = end_date.year
-
     matching_files = []
-    for year in range(start_year, end_year + 1):
+    for year in range(start_date.year, end_date.year + 1):
         year_files = get_required_tif_files(parameter, year, start_date, end_date)
         matching_files.extend(year_files)
 
@@ -395,21 +825,60 @@ def perform_operation(operation, parameter, time_range, location=None, with_tren
         logger.error("No matching data files found")
         return "No matching data files found."
 
-    # Crop the data and get coordinate grids
-    cropped_data, cropped_lat_grid, cropped_lon_grid = read_geotiff_files(matching_files, location)
-    if cropped_data is None:
-        return "No valid cropped data found."
+    return matching_files
 
-    # Compute statistics on cropped data
-    result = compute_statistic(cropped_data, operation, return_daily=with_trend, return_spatial=with_spatial)
+def perform_operation(operation, parameter, time_range, location=None, with_trend=True, with_spatial=True, preview=False, refine=True, area_weighted=False):
+    if preview:
+        return perform_preview_operation(operation, parameter, time_range, location,
+                                         with_trend=with_trend, with_spatial=with_spatial, refine=refine,
+                                         area_weighted=area_weighted)
 
-    if isinstance(result, str):
-        logger.error(f"Computation failed: {result}")
-        return result
+    logger.info(f"===== PERFORMING {operation.upper()} ON {parameter.upper()} =====")
+    logger.info(f"Time range: {time_range[0]} to {time_range[1]}")
+    logger.info(f"Location: {location or 'global'}")
+    
+    time_window = resolve_time_range(time_range)
+    if isinstance(time_window, str):
+        return time_window
+    start_date, end_date = time_window
+
+    if location is not None and not isinstance(location, str):
+        logger.error(f"Location must be a single region name: {location}")
+        return "This operation covers one location at a time. Ask about a single region."
+    location = location.lower() if location else location
+
+    if location and get_region(location) is None:
+        logger.error(f"Invalid location: '{location}'")
+        return f"Invalid location: '{location}'"
+
+    matching_files = find_matching_files(parameter, start_date, end_date)
+    if isinstance(matching_files, str):
+        return matching_files
+
+    if operation in CLIMATOLOGY_OPERATIONS:
+        # Anomalies are averaged; the baseline is read from the stored climatology
+        read_tile = anomaly_reader(parameter, operation)
+        if isinstance(read_tile, str):
+            return read_tile
+        statistic = "mean"
+    else:
+        read_tile = read_planned_tile
+        statistic = operation
+
+    # Plan, admit and compute statistics on the cropped data
+    make_plan = functools.partial(get_region_plan, get_region(location))
+    executed = execute_query(matching_files, make_plan, statistic, read_tile,
+                             return_daily=with_trend, return_spatial=with_spatial,
+                             label=f"{operation} {parameter} {location or 'global'}", area_weighted=area_weighted)
+
+    if isinstance(executed, str):
+        logger.error(f"Computation failed: {executed}")
+        return executed
+    result, cropped_lat_grid, cropped_lon_grid = executed
 
     scalar_result = result["scalar"]
     # Get the unit for the parameter (default to empty string if not found)
-    unit = PARAMETER_UNITS.get(parameter.lower(), "")
+    unit = PARAMETER_UNITS.get(parameter.lower(), "") if operation != "zscore" else ""
     # Keep the numeric value separate and provide the unit separately
     logger.info(f"{operation.capitalize()} value over the selected region and time: {scalar_result} {unit}")
 
@@ -435,11 +904,123 @@ def perform_operation(operation, parameter, time_range, location=None, with_tren
         "spatial_graph": spatial_plot_html
     }
 
+def perform_preview_operation(operation, parameter, time_range, location=None, with_trend=True, with_spatial=True,
+                              refine=True, max_side=PREVIEW_MAX_SIDE, max_days=PREVIEW_MAX_DAYS, area_weighted=False):
+    """
+    Quick-look version of perform_operation. Reads decimated tiles (from
+    GeoTIFF overviews where present) for an evenly spaced sample of at most
+    max_days days and returns an approximate value with a bootstrap error
+    estimate covering both the day sampling and the spatial decimation. With
+    refine, the exact result is computed in the background and can be fetched
+    with the returned refinement_id.
+    """
+    logger.info(f"===== PREVIEW {operation.upper()} ON {parameter.upper()} =====")
+
+    if operation in CLIMATOLOGY_OPERATIONS or operation not in SUPPORTED_OPERATIONS or operation == "trend":
+        logger.error(f"Preview not available for operation: {operation}")
+        return f"Preview is not available for '{operation}'."
+
+    time_window = resolve_time_range(time_range)
+    if isinstance(time_window, str):
+        return time_window
+    start_date, end_date = time_window
+
+    if location is not None and not isinstance(location, str):
+        logger.error(f"Location must be a single region name: {location}")
+        return "This operation covers one location at a time. Ask about a single region."
+    location = location.lower() if location else location
+    if location and get_region(location) is None:
+        logger.error(f"Invalid location: '{location}'")
+        return f"Invalid location: '{location}'"
+
+    matching_files = find_matching_files(parameter, start_date, end_date)
+    if isinstance(matching_files, str):
+        return matching_files
+
+    sampled_files = sample_files(matching_files, max_days)
+    make_plan = functools.partial(get_region_plan, get_region(location))
+    tiles = []
+    dates = []
+    lat_grid = lon_grid = None
+    factor = 1
+    for file in sampled_files:
+        try:
+            preview_tile = read_preview_tile(file, make_plan, max_side, averaged_ok=operation == "mean")
+        except Exception as e:
+            logger.error(f"Failed reading {file}: {e}")
+            continue
+        if preview_tile is None:
+            continue
+        tile, lats, lons, factor = preview_tile
+        if tiles and tile.shape != tiles[0].shape:
+            logger.error(f"Inconsistent shapes in preview data for {file}")
+            return "Inconsistent grids in preview data."
+        if valid_count(tile) == 0:
+            continue
+        tiles.append(tile)
+        dates.append(get_file_date(file))
+        if lat_grid is None:
+            lat_grid, lon_grid = lats, lons
+
+    if not tiles:
+        return "No valid cropped data found."
+    cube = stack_tiles(tiles)
+
+    weights = area_weights(lat_grid) if area_weighted else None
+    result = compute_statistic(cube, operation, return_daily=with_trend, return_spatial=with_spatial, weights=weights,
+                               dates=dates)
+    if isinstance(result, str):
+        logger.error(f"Preview computation failed: {result}")
+        return result
+
+    if weights is not None and operation == "mean":
+        statistic_fn = lambda c: weighted_nanmean(c, weights)
+    else:
+        statistic_fn = lambda c: calculate_statistic_along(c, operation)
+    error = bootstrap_error(cube, statistic_fn, population=len(matching_files), factor=factor)
+    if operation in ["max", "min", "range"]:
+        # Resampling cannot see how far a subsample's extremes fall short, so add that bias
+        error = math.hypot(error, extreme_shortfall(cube, statistic_fn, population=len(matching_files), factor=factor))
+    unit = PARAMETER_UNITS.get(parameter.lower(), "")
+    logger.info(f"Preview {operation} over {len(cube)}/{len(matching_files)} days at 1/{factor} resolution: "
+                f"{result['scalar']} ± {error} {unit}")
+
+    trend_plot_html = None
+    spatial_plot_html = None
+    if result["trend"]:
+        dates, values = result["trend"]
+        trend_plot_html = plot_trend(dates, values, operation, title=f"Daily {operation.capitalize()} Trend (preview)")
+    if result["spatial"] is not None:
+        title = f"Spatial {operation.capitalize()} Preview - {location.title() if location else 'Global'}"
+        spatial_plot_html = plot_spatial_raster(result["spatial"], lat_grid, lon_grid, title=title)
+
+    refinement_id = None
+    exact = len(cube) == len(matching_files) and factor == 1
+    if refine and not exact:
+        refinement_id = start_refinement(perform_operation, operation, parameter, time_range, location,
+                                         with_trend=with_trend, with_spatial=with_spatial, area_weighted=area_weighted)
+
+    return {
+        "operation": operation,
+        "value": result["scalar"],
+        "unit": unit,
+        "parameter": parameter,
+        "time_range": time_range,
+        "location": location,
+        "trend_graph": trend_plot_html,
+        "spatial_graph": spatial_plot_html,
+        "approximate": not exact,
+        "error_estimate": error,
+        "sampled_days": len(cube),
+        "total_days": len(matching_files),
+        "decimation": factor,
+        "refinement_id": refinement_id
+    }
+
 def perform_all_operations(parameter, time_range, location=None):
     results = {}
-    operations = [op for op in SUPPORTED_OPERATIONS if op != "trend"]
 
-    for operation in operations:
+    for operation in ALL_OPERATIONS:
         logger.info(f"--- {operation.upper()} ---")
         result = perform_operation(operation, parameter, time_range, location)
         if isinstance(result, dict) and "value" in result:
@@ -452,4 +1033,305 @@ def perform_all_operations(parameter, time_range, location=None):
         else:
             results[operation] = {"error": result}
 
-    return results
\ No newline at end of file
+    return results
+
+def resolve_regions(regions=None):
+    """
+    Normalise a list of regions to {name: region spec}.
+    Each entry is either a known location name, a custom box dict with
+    lon_min/lon_max/lat_min/lat_max, or a dict with a GeoJSON "geometry";
+    custom entries may carry a "name".
+    Returns the mapping or an error message.
+    """
+    if not regions:
+        return {name: get_region(name) for name in known_locations()}
+
+    resolved = {}
+    for i, region in enumerate(regions):
+        if isinstance(region, str):
+            spec = get_region(region)
+            if spec is None:
+                logger.error(f"Invalid location: '{region}'")
+                return f"Invalid location: '{region}'"
+            resolved[region.lower()] = spec
+        elif isinstance(region, dict) and isinstance(region.get("geometry"), dict):
+            if region["geometry"].get("type") not in ("Polygon", "MultiPolygon", "GeometryCollection"):
+                return f"Unsupported region geometry: {region['geometry'].get('type')}"
+            resolved[str(region.get("name", f"region {i + 1}")).lower()] = {"geometry": region["geometry"]}
+        elif isinstance(region, dict):
+            try:
+                spec = {key: float(region[key]) for key in ("lon_min", "lon_max", "lat_min", "lat_max")}
+            except (KeyError, TypeError, ValueError):
+                logger.error(f"Invalid region box: {region}")
+                return f"Invalid region box: {region}"
+            resolved[str(region.get("name", f"region {i + 1}")).lower()] = spec
+        else:
+            return f"Invalid region: {region}"
+    return resolved
+
+def read_union_tiles(matching_files, regions):
+    """
+    Read each file once, covering the union of the regions' windows.
+    Returns (stacked data, dates, union plan, (transform, width, height)) or None.
+    """
+    tiles = []
+    dates = []
+    union_plan = grid = None
+    regions = list(regions)
+    grids = []
+
+    def make_plan(transform, width, height):
+        grids.append((transform, width, height))
+        return get_union_plan(regions, transform, width, height)
+
+    for file in sorted(matching_files):
+        try:
+            planned = read_planned_tile(file, make_plan, apply_mask=False)
+        except Exception as e:
+            logger.error(f"Failed reading {file}: {e}")
+            continue
+        if planned is None:
+            logger.warning(f"No data within bounds for {os.path.basename(file)}. Skipping.")
+            continue
+        if grid is not None and grids[-1] != grid:
+            logger.error(f"Inconsistent grid in {file}")
+            return None
+        data, union_plan = planned
+        grid = grids[-1]
+        tiles.append(data)
+        dates.append(get_file_date(file))
+
+    if not tiles:
+        logger.warning("No valid cropped data found in any of the files")
+        return None
+    return stack_tiles(tiles), dates, union_plan, grid
+
+def compute_region_statistics(stacked, union_plan, grid, regions, operation, return_daily=True, return_spatial=True, area_weighted=False):
+    """
+    Apply per-region pixel masks to a stack of union-window tiles.
+    Every statistic is a single vectorized reduction over the region's window.
+    With area_weighted, means are weighted by cos(latitude).
+    Returns {name: {"scalar", "daily", "spatial", "lats", "lons"}} with None
+    entries for regions that fall outside the grid.
+    """
+    results = {}
+    for name, spec in regions.items():
+        plan = get_region_plan(spec, *grid)
+        if plan is None:
+            logger.warning(f"Region '{name}' has no pixels on the data grid")
+            results[name] = None
+            continue
+        row_index, col_index = plan_slices(union_plan, plan)
+
+        region_data = stacked[:, row_index, col_index]
+        if not plan["mask"].all():
+            region_data = np.where(plan["mask"], region_data, np.nan)
+
+        if area_weighted and operation == "mean":
+            scalar = float(weighted_nanmean(region_data, plan["area_weights"]))
+            daily = weighted_nanmean(region_data, plan["area_weights"], axis=(1, 2)) if return_daily else None
+        else:
+            scalar = float(calculate_statistic_along(region_data, operation))
+            daily = calculate_statistic_along(region_data, operation, axis=(1, 2)) if return_daily else None
+
+        results[name] = {
+            "scalar": scalar,
+            "daily": daily,
+            "spatial": calculate_statistic_along(region_data, operation, axis=0) if return_spatial else None,
+            "lats": plan["lats"],
+            "lons": plan["lons"],
+        }
+    return results
+
+def perform_multi_region_operation(operation, parameter, time_range, regions=None, with_trend=True, with_spatial=True, with_graphs=True, area_weighted=False):
+    """
+    Compute one operation for several regions in a single pass over the tiles.
+    Each file is read once, covering the union of the regions, and per-region
+    scalars, daily series and spatial maps are returned together. Spatial maps
+    are returned as data ({"values", "lats", "lons"}) and, with with_graphs,
+    as plots.
+    """
+    logger.info(f"===== PERFORMING MULTI-REGION {operation.upper()} ON {parameter.upper()} =====")
+    logger.info(f"Time range: {time_range[0]} to {time_range[1]}")
+
+    if operation not in SUPPORTED_OPERATIONS or operation == "trend" or operation in CLIMATOLOGY_OPERATIONS:
+        logger.error(f"Unsupported operation: {operation}")
+        return f"Unsupported operation: '{operation}'"
+
+    region_specs = resolve_regions(regions)
+    if isinstance(region_specs, str):
+        return region_specs
+    logger.info(f"Regions: {', '.join(region_specs)}")
+
+    time_window = resolve_time_range(time_range)
+    if isinstance(time_window, str):
+        return time_window
+    start_date, end_date = time_window
+
+    matching_files = find_matching_files(parameter, start_date, end_date)
+    if isinstance(matching_files, str):
+        return matching_files
+
+    try:
+        estimate = plan_query(matching_files, functools.partial(get_union_plan, list(region_specs.values())),
+                              operation, with_spatial=with_spatial)
+    except Exception as e:
+        logger.error(f"Could not plan query: {e}")
+        return f"Could not read data files: {e}"
+    if estimate is None:
+        return "No valid cropped data found."
+
+    if estimate["strategy"] == IN_MEMORY:
+        try:
+            with admitted(estimate["peak_bytes"], f"{operation} {parameter} {len(region_specs)} regions"):
+                tiles = read_union_tiles(matching_files, region_specs.values())
+                if tiles is None:
+                    return "No valid cropped data found."
+                stacked, dates, union_plan, grid = tiles
+                region_stats = compute_region_statistics(stacked, union_plan, grid, region_specs, operation,
+                                                         return_daily=with_trend, return_spatial=with_spatial,
+                                                         area_weighted=area_weighted)
+                del stacked
+        except AdmissionError as e:
+            logger.warning(f"Query not admitted: {e}")
+            return str(e)
+        for stats in region_stats.values():
+            if stats is not None:
+                stats["dates"] = dates
+    else:
+        # The union stack would not fit in memory; plan each region on its own
+        logger.info("Union window too large for one pass; computing regions separately")
+        region_stats = {}
+        for name, spec in region_specs.items():
+            executed = execute_query(matching_files, functools.partial(get_region_plan, spec), operation,
+                                     return_daily=with_trend, return_spatial=with_spatial,
+                                     label=f"{operation} {parameter} {name}", area_weighted=area_weighted)
+            if isinstance(executed, str):
+                logger.warning(f"Region '{name}' failed: {executed}")
+                region_stats[name] = None
+                continue
+            result, lat_grid, lon_grid = executed
+            region_stats[name] = {
+                "scalar": result["scalar"],
+                "daily": result["trend"][1] if result["trend"] else None,
+                "dates": result["trend"][0] if result["trend"] else None,
+                "spatial": result["spatial"],
+                "lats": lat_grid,
+                "lons": lon_grid,
+            }
+
+    unit = PARAMETER_UNITS.get(parameter.lower(), "")
+
+    region_results = {}
+    for name, stats in region_stats.items():
+        if stats is None:
+            region_results[name] = {"error": "No data within region bounds."}
+            continue
+
+        daily_values = [float(v) for v in stats["daily"]] if stats["daily"] is not None else None
+        dates = stats["dates"]
+        trend_plot_html = None
+        spatial_plot_html = None
+        if daily_values is not None and with_graphs:
+            trend_plot_html = plot_trend(dates, daily_values, operation,
+                                         title=f"Daily {operation.capitalize()} Trend - {name.title()}")
+        if stats["spatial"] is not None and with_graphs:
+            spatial_plot_html = plot_spatial_raster(stats["spatial"], stats["lats"], stats["lons"],
+                                                    title=f"Spatial {operation.capitalize()} Plot - {name.title()}")
+
+        spatial_map = None
+        if stats["spatial"] is not None:
+            spatial_map = {
+                "values": np.asarray(stats["spatial"], dtype=np.float64).tolist(),
+                "lats": np.asarray(stats["lats"]).tolist(),
+                "lons": np.asarray(stats["lons"]).tolist(),
+            }
+
+        logger.info(f"{operation.capitalize()} value over {name}: {stats['scalar']} {unit}")
+        region_results[name] = {
+            "value": stats["scalar"],
+            "unit": unit,
+            "dates": [d.strftime("%Y-%m-%d") for d in dates] if daily_values is not None else None,
+            "daily_values": daily_values,
+            "spatial_map": spatial_map,
+            "trend_graph": trend_plot_html,
+            "spatial_graph": spatial_plot_html,
+        }
+
+    return {
+        "operation": operation,
+        "parameter": parameter,
+        "time_range": time_range,
+        "unit": unit,
+        "regions": region_results,
+    }
+
+def perform_region_operations(operations, parameter, time_range, regions):
+    """
+    Compute several operations for several regions from one read of the
+    tiles: each file is read once, covering the union of the regions, and
+    every operation is applied to the same stack. Only scalars are computed.
+    When the union stack does not fit in memory, each operation gets its own
+    multi-region pass instead.
+    Returns {"unit", "results": {operation: {region: {"value", "unit"} or
+    {"error"}}}} or an error message.
+    """
+    logger.info(f"===== PERFORMING {', '.join(op.upper() for op in operations)} ON {parameter.upper()} =====")
+    for operation in operations:
+        if operation not in ALL_OPERATIONS:
+            logger.error(f"Unsupported operation: {operation}")
+            return f"Unsupported operation: '{operation}'"
+
+    region_specs = resolve_regions(regions)
+    if isinstance(region_specs, str):
+        return region_specs
+
+    time_window = resolve_time_range(time_range)
+    if isinstance(time_window, str):
+        return time_window
+    start_date, end_date = time_window
+
+    matching_files = find_matching_files(parameter, start_date, end_date)
+    if isinstance(matching_files, str):
+        return matching_files
+
+    unit = PARAMETER_UNITS.get(parameter.lower(), "")
+    try:
+        # Every operation plans the same stack; only the fallback strategy differs
+        estimate = plan_query(matching_files, functools.partial(get_union_plan, list(region_specs.values())),
+                              operations[0], with_spatial=False)
+    except Exception as e:
+        logger.error(f"Could not plan query: {e}")
+        return f"Could not read data files: {e}"
+    if estimate is None:
+        return "No valid cropped data found."
+
+    if estimate["strategy"] != IN_MEMORY:
+        logger.info("Union window too large for one pass; computing operations separately")
+        results = {}
+        for operation in operations:
+            result = perform_multi_region_operation(operation, parameter, time_range, regions,
+                                                    with_trend=False, with_spatial=False, with_graphs=False)
+            results[operation] = result["regions"] if isinstance(result, dict) else {name: {"error": result} for name in region_specs}
+        return {"unit": unit, "results": results}
+
+    try:
+        with admitted(estimate["peak_bytes"], f"{len(operations)} operations {parameter} {len(region_specs)} regions"):
+            tiles = read_union_tiles(matching_files, region_specs.values())
+            if tiles is None:
+                return "No valid cropped data found."
+            stacked, _, union_plan, grid = tiles
+            results = {}
+            for operation in operations:
+                region_stats = compute_region_statistics(stacked, union_plan, grid, region_specs, operation,
+                                                         return_daily=False, return_spatial=False)
+                results[operation] = {
+                    name: {"value": stats["scalar"], "unit": unit} if stats is not None else {"error": "No data within region bounds."}
+                    for name, stats in region_stats.items()
+                }
+            del stacked
+    except AdmissionError as e:
+        logger.warning(f"Query not admitted: {e}")
+        return str(e)
+
+    return {"unit": unit, "results": results}
@@ -1,6 +1,6 @@
-import speech_recognition as sr
 import requests
 import json
+import sys
 from src.compute import perform_operation  # Import the updated computation function
 import calendar
 import logging
@@ -28,6 +28,9 @@ logger.addHandler(stream_handler)
 
 def get_user_input():
     """Captures user input via speech or text."""
+    # Imported here so batch runs never pay for audio setup
+    import speech_recognition as sr
+
     recognizer = sr.Recognizer()
     
     with sr.Microphone() as source:
@@ -66,6 +69,7 @@ Identify and extract:
   - If a full date range is given, return it as-is.
 - "parameter": The environmental parameter requested (e.g., temperature, ocean currents, wind speed).
 - "operation": The computation required (e.g., mean, max, min, variance, range, variability).
+  - Use "anomaly" for questions about how unusual a value is compared to normal, and "zscore" for standardized anomalies.
 
 Return the output as valid JSON only.
 - Use double quotes `"` around all keys and values.
@@ -158,5 +162,9 @@ def main():
     logger.info("\nOllama Response: %s", response)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Batch mode: python -m src.main QUERIES_FILE [-o results.jsonl] [-w WORKERS]
+        from src.batch import main as batch_main
+        sys.exit(batch_main(sys.argv[1:]))
     main()
 
@@ -0,0 +1,210 @@
+import os
+import json
+import math
+import time
+import uuid
+import fcntl
+import threading
+import contextlib
+import logging
+import numpy as np
+import rasterio
+from .tiles import band_scaling, working_dtype
+from .tile_cache import TILE_CACHE_DIR, _pid_alive
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Memory all running queries on this host may use together, across workers
+MEMORY_BUDGET_BYTES = int(float(os.environ.get("NICES_MEMORY_BUDGET_MB", "4096")) * MB)
+
+# Memory a single query may plan for; larger queries stream or partition
+QUERY_MEMORY_BYTES = int(float(os.environ.get("NICES_QUERY_MEMORY_MB", MEMORY_BUDGET_BYTES / 4 / MB)) * MB)
+
+# How long a query may wait for memory before it is rejected
+ADMISSION_TIMEOUT_SECONDS = float(os.environ.get("NICES_ADMISSION_TIMEOUT", "120"))
+
+# The admission ledger is shared by every worker process on the host
+ADMISSION_LEDGER = os.environ.get("NICES_ADMISSION_LEDGER",
+                                  os.path.join(os.path.dirname(TILE_CACHE_DIR), "nices_admission.json"))
+
+# Execution strategies, cheapest first
+IN_MEMORY = "in_memory"
+STREAMING = "streaming"
+PARTITIONED = "partitioned"
+
+# Operations that need every value at once and so cannot be streamed
+NON_STREAMABLE_OPERATIONS = ["median"]
+
+
+class AdmissionError(Exception):
+    """Raised when a query cannot be admitted within the memory budget."""
+
+
+def estimate_query(n_files, window_shape, dtype, operation, scaled=False, with_spatial=True):
+    """
+    Estimate peak memory and bytes read for each execution strategy.
+    window_shape is the (rows, cols) window read from every file and dtype
+    the band's native dtype.
+    """
+    rows, cols = window_shape
+    pixels = rows * cols
+    native = np.dtype(dtype).itemsize
+    work = working_dtype(dtype).itemsize
+    # Tiles are kept in native dtype (working dtype once scaled) plus a 1-byte mask
+    tile_bytes = pixels * ((work if scaled else native) + 1)
+    cube_bytes = n_files * pixels * work
+    # Tiles are freed as they are copied into the cube, so stacking holds at
+    # most one of each day's tile or its slice of the cube
+    stacking = n_files * max(tile_bytes, pixels * work)
+    # nan* reductions copy the cube once and build a 1-byte NaN mask and its
+    # inverse alongside; the scalar median's copy of the valid values fits in
+    # the same room, and the spatial median runs over row blocks of the cube
+    # (MEDIAN_ROW_BLOCKS) so its sorted copies stay well below it
+    temporaries = cube_bytes + 2 * n_files * pixels
+    spatial_bytes = pixels * 8 if with_spatial else 0
+
+    in_memory = max(stacking, cube_bytes + temporaries) + spatial_bytes
+    # One tile plus float64 accumulators (count, mean, M2, max, min) and their temporaries
+    streaming = tile_bytes + pixels * work + pixels * (4 + 8 * 4) + pixels * 8 * 3
+    return {
+        "files": n_files,
+        "window": [rows, cols],
+        "dtype": str(np.dtype(dtype)),
+        "read_bytes": n_files * pixels * (native + 1),
+        "in_memory_bytes": in_memory,
+        "streaming_bytes": streaming,
+        "operation": operation,
+    }
+
+
+def choose_strategy(estimate, budget=QUERY_MEMORY_BYTES):
+    """
+    Pick the cheapest strategy whose peak memory fits the per-query budget:
+    an in-memory stack, a streaming pass with per-pixel accumulators, or a
+    partitioned pass over row blocks. Adds "strategy", "partitions" and
+    "peak_bytes" to the estimate; strategy is None if nothing fits.
+    """
+    rows = estimate["window"][0]
+    estimate.update(strategy=None, partitions=1, peak_bytes=estimate["in_memory_bytes"])
+
+    if estimate["in_memory_bytes"] <= budget:
+        estimate["strategy"] = IN_MEMORY
+    elif estimate["operation"] not in NON_STREAMABLE_OPERATIONS and estimate["streaming_bytes"] <= budget:
+        estimate.update(strategy=STREAMING, peak_bytes=estimate["streaming_bytes"])
+    else:
+        partitions = math.ceil(estimate["in_memory_bytes"] / budget)
+        if partitions <= rows:
+            estimate.update(strategy=PARTITIONED, partitions=partitions,
+                            peak_bytes=math.ceil(estimate["in_memory_bytes"] / partitions))
+    return estimate
+
+
+def plan_query(matching_files, make_plan, operation, with_spatial=True, budget=QUERY_MEMORY_BYTES):
+    """
+    Plan a query before reading any pixels: the first file's header gives the
+    grid, window and dtype, and the file count the depth of the stack.
+    Returns the estimate with the chosen strategy, or None if the region has
+    no pixels on the grid.
+    """
+    with rasterio.open(sorted(matching_files)[0]) as src:
+        plan = make_plan(src.transform, src.width, src.height)
+        if plan is None:
+            return None
+        dtype = src.dtypes[0]
+        scaled = band_scaling(src) != (1.0, 0.0)
+
+    estimate = estimate_query(len(matching_files), plan["mask"].shape, dtype, operation,
+                              scaled=scaled, with_spatial=with_spatial)
+    choose_strategy(estimate, budget)
+    logger.info(f"Query plan: {estimate['strategy']} x{estimate['partitions']} for {estimate['files']} files of "
+                f"{estimate['window'][0]}x{estimate['window'][1]} {estimate['dtype']}, "
+                f"peak {estimate['peak_bytes'] / MB:.1f} MB, read {estimate['read_bytes'] / MB:.1f} MB")
+    return estimate
+
+
+class _LedgerLock:
+    """Exclusive flock on the admission ledger, plus a thread lock for this process."""
+    _thread_lock = threading.Lock()
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        os.makedirs(os.path.dirname(ADMISSION_LEDGER), exist_ok=True)
+        self._fh = open(f"{ADMISSION_LEDGER}.lock", "a")
+        fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        fcntl.flock(self._fh, fcntl.LOCK_UN)
+        self._fh.close()
+        self._thread_lock.release()
+        return False
+
+
+def _load_ledger():
+    """Current admissions, dropping those held by processes that have exited."""
+    try:
+        with open(ADMISSION_LEDGER) as f:
+            ledger = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {token: entry for token, entry in ledger.items() if _pid_alive(entry["pid"])}
+
+
+def _save_ledger(ledger):
+    tmp_path = f"{ADMISSION_LEDGER}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(ledger, f)
+    os.replace(tmp_path, ADMISSION_LEDGER)
+
+
+def acquire_memory(nbytes, label="", timeout=ADMISSION_TIMEOUT_SECONDS):
+    """
+    Reserve nbytes of the server-wide memory budget, waiting up to timeout
+    seconds for running queries to finish. Returns a token for release_memory.
+    Raises AdmissionError if the query can never fit or the wait times out.
+    """
+    if nbytes > MEMORY_BUDGET_BYTES:
+        raise AdmissionError(f"Query needs about {nbytes / MB:.0f} MB, more than the server's "
+                             f"{MEMORY_BUDGET_BYTES / MB:.0f} MB memory budget. Narrow the region or time range.")
+
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + timeout
+    waited = False
+    while True:
+        with _LedgerLock():
+            ledger = _load_ledger()
+            in_use = sum(entry["bytes"] for entry in ledger.values())
+            if in_use + nbytes <= MEMORY_BUDGET_BYTES:
+                ledger[token] = {"pid": os.getpid(), "bytes": nbytes, "label": label, "since": time.time()}
+                _save_ledger(ledger)
+                logger.info(f"Admitted {label or 'query'}: {nbytes / MB:.1f} MB "
+                            f"({(in_use + nbytes) / MB:.1f}/{MEMORY_BUDGET_BYTES / MB:.0f} MB in use)")
+                return token
+
+        if time.monotonic() >= deadline:
+            raise AdmissionError(f"Server busy: {in_use / MB:.0f} MB of {MEMORY_BUDGET_BYTES / MB:.0f} MB in use "
+                                 f"and this query needs {nbytes / MB:.0f} MB. Try again later.")
+        if not waited:
+            logger.info(f"Queueing {label or 'query'} for {nbytes / MB:.1f} MB; {in_use / MB:.1f} MB in use")
+            waited = True
+        time.sleep(0.25)
+
+
+def release_memory(token):
+    with _LedgerLock():
+        ledger = _load_ledger()
+        if ledger.pop(token, None) is not None:
+            _save_ledger(ledger)
+
+
+@contextlib.contextmanager
+def admitted(nbytes, label=""):
+    """Hold a reservation of nbytes of the memory budget for the duration of the block."""
+    token = acquire_memory(nbytes, label)
+    try:
+        yield
+    finally:
+        release_memory(token)
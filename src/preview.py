@@ -0,0 +1,303 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import uuid
+import argparse
+import datetime
+import tempfile
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from .tiles import band_scaling, make_tile
+from .regions import read_plan_window
+from .tile_cache import TILE_CACHE_DIR
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Overview levels built at ingest
+OVERVIEW_FACTORS = [2, 4, 8, 16, 32]
+
+# Preview budget: pixels along the longer side of each tile and days sampled
+PREVIEW_MAX_SIDE = int(os.environ.get("NICES_PREVIEW_MAX_SIDE", "256"))
+PREVIEW_MAX_DAYS = int(os.environ.get("NICES_PREVIEW_MAX_DAYS", "16"))
+
+# Finished refinements are stored next to the tile cache so any worker can serve them
+REFINEMENT_DIR = os.environ.get("NICES_REFINEMENT_DIR",
+                                os.path.join(os.path.dirname(TILE_CACHE_DIR), "nices_refinements"))
+REFINEMENT_WORKERS = int(os.environ.get("NICES_REFINEMENT_WORKERS", "2"))
+REFINEMENT_TTL_SECONDS = 3600
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def has_overviews(src, band=1):
+    return bool(src.overviews(band))
+
+
+def overview_resampling(src):
+    """Resampling the file's overviews were built with ("unknown" if untagged), or None if it has none."""
+    if not has_overviews(src):
+        return None
+    return src.tags(ns="rio_overview").get("resampling", "unknown")
+
+
+def build_overviews(file, factors=OVERVIEW_FACTORS):
+    """
+    Add internal overviews to a GeoTIFF if it has none. Returns True if built.
+    Overviews use nearest-neighbour resampling so every overview pixel is a
+    real observation: averaging would smooth away the extremes and spread
+    that max, min, range and deviation previews depend on.
+    """
+    with rasterio.open(file, "r+") as dst:
+        if has_overviews(dst):
+            return False
+        factors = [f for f in factors if f < max(dst.width, dst.height)]
+        if not factors:
+            return False
+        dst.build_overviews(factors, Resampling.nearest)
+        dst.update_tags(ns="rio_overview", resampling="nearest")
+    logger.info(f"Built overviews {factors} for {os.path.basename(file)}")
+    return True
+
+
+def sample_files(files, max_days=PREVIEW_MAX_DAYS):
+    """Evenly spaced subset of at most max_days files, always including the first and last."""
+    files = sorted(files)
+    if len(files) <= max_days:
+        return files
+    picks = np.unique(np.round(np.linspace(0, len(files) - 1, max_days)).astype(int))
+    return [files[i] for i in picks]
+
+
+def decimation_factor(plan, max_side=PREVIEW_MAX_SIDE):
+    rows = plan["row_end"] - plan["row_start"]
+    cols = len(plan["cols"])
+    return max(1, math.ceil(max(rows, cols) / max_side))
+
+
+def _overview_level(src, factor, averaged_ok=False):
+    """
+    Overview level to read for a decimation factor: the coarsest level that
+    is no coarser than asked for. Returns (level index, level factor), or
+    (None, 1) when the file has no usable overviews.
+    """
+    resampling = overview_resampling(src)
+    if resampling is None or (resampling != "nearest" and not averaged_ok):
+        return None, 1
+    levels = [i for i, level_factor in enumerate(src.overviews(1)) if level_factor <= factor]
+    if not levels:
+        return None, 1
+    return levels[-1], src.overviews(1)[levels[-1]]
+
+
+def read_preview_tile(file, make_plan, max_side=PREVIEW_MAX_SIDE, apply_mask=True, averaged_ok=False):
+    """
+    Read a decimated version of a region's window.
+    When the file has nearest-neighbour overviews, the closest overview level
+    is opened as a grid of its own and the region is planned on it, so the
+    mask and coordinate axes describe the overview's cells. Otherwise the
+    full-resolution window is read and strided explicitly, and the mask and
+    axes are strided the same way. Overviews built by averaging are only used
+    when averaged_ok is set, as they are only unbiased for means.
+    Returns (masked tile, lat axis, lon axis, factor), or None if the region
+    has no pixels on the grid.
+    """
+    read = None
+    with rasterio.open(file) as src:
+        plan = make_plan(src.transform, src.width, src.height)
+        if plan is None:
+            return None
+        factor = decimation_factor(plan, max_side)
+        scale, offset = band_scaling(src)
+        level, level_factor = _overview_level(src, factor, averaged_ok) if factor > 1 else (None, 1)
+        if level is None:
+            read = read_plan_window(src, plan)
+
+    if read is None:
+        with rasterio.open(file, OVERVIEW_LEVEL=level) as overview:
+            overview_plan = make_plan(overview.transform, overview.width, overview.height)
+            if overview_plan is not None:
+                plan = overview_plan
+                read = read_plan_window(overview, plan)
+    if read is None:
+        # The region vanishes on the overview grid; stride the full-resolution window instead
+        level_factor = 1
+        with rasterio.open(file) as src:
+            read = read_plan_window(src, plan)
+
+    stride = math.ceil(factor / level_factor)
+    data, invalid = read[0][::stride, ::stride], read[1][::stride, ::stride]
+    if apply_mask:
+        invalid = invalid | ~plan["mask"][::stride, ::stride]
+    return make_tile(data, invalid, scale, offset), plan["lats"][::stride], plan["lons"][::stride], level_factor * stride
+
+
+def bootstrap_error(cube, statistic_fn, population=None, factor=1, n_resamples=50, seed=0, n_blocks=32):
+    """
+    Standard error of statistic_fn(cube) for a preview that used only some of
+    population days and, when factor > 1, about one pixel in factor**2.
+    Day error resamples the sampled days with replacement; spatial error
+    resamples blocks of columns with replacement, so row weights such as
+    cos(latitude) stay aligned. Each part gets a finite-population correction
+    for the fraction it sampled and the two are combined in quadrature.
+    Returns 0.0 when every day and pixel was used and NaN when there are too
+    few days or columns to estimate.
+    """
+    n = cube.shape[0]
+    rng = np.random.default_rng(seed)
+    variance = 0.0
+
+    if population is None or n < population:
+        if n < 2:
+            return float("nan")
+        estimates = [float(statistic_fn(cube[rng.integers(0, n, n)])) for _ in range(n_resamples)]
+        day_variance = float(np.nanvar(estimates, ddof=1))
+        if population:
+            day_variance *= max(0.0, (population - n) / max(population - 1, 1))
+        variance += day_variance
+
+    if factor > 1:
+        blocks = np.array_split(np.arange(cube.shape[2]), min(cube.shape[2], n_blocks))
+        if len(blocks) < 2:
+            return float("nan")
+        estimates = []
+        for _ in range(n_resamples):
+            picks = rng.integers(0, len(blocks), len(blocks))
+            estimates.append(float(statistic_fn(cube[:, :, np.concatenate([blocks[i] for i in picks])])))
+        variance += float(np.nanvar(estimates, ddof=1)) * (1.0 - 1.0 / factor ** 2)
+
+    return math.sqrt(variance)
+
+
+def extreme_shortfall(cube, statistic_fn, population=None, factor=1):
+    """
+    Expected shortfall of an extreme (max, min or range) computed from a
+    subsample. Extremes of a subsample are biased towards the centre by an
+    amount that grows with the log of the sample size, so the shift between
+    the preview and its four phase-shifted half-resolution sub-grids is
+    extrapolated to the full data. Returns 0.0 when every day and pixel was
+    used and NaN when the preview is too small to compare.
+    """
+    fraction = (cube.shape[0] / population if population else 1.0) / factor ** 2
+    if fraction >= 1:
+        return 0.0
+    n = int(np.sum(~np.isnan(cube)))
+    statistic = float(statistic_fn(cube))
+    shifts, ratios = [], []
+    for row, col in [(0, 0), (0, 1), (1, 0), (1, 1)]:
+        sub = cube[:, row::2, col::2]
+        n_sub = int(np.sum(~np.isnan(sub)))
+        if 0 < n_sub < n:
+            shifts.append(abs(statistic - float(statistic_fn(sub))))
+            ratios.append(math.log(n / n_sub))
+    if not shifts:
+        return float("nan")
+    return float(np.mean(shifts)) * math.log(1.0 / fraction) / float(np.mean(ratios))
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        # Created lazily so each pre-forked worker gets its own threads
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REFINEMENT_WORKERS, thread_name_prefix="refine")
+        return _executor
+
+
+def _refinement_path(job_id, suffix):
+    return os.path.join(REFINEMENT_DIR, f"{job_id}.{suffix}")
+
+
+def _run_refinement(job_id, fn, args, kwargs):
+    try:
+        result = fn(*args, **kwargs)
+        record = {"status": "done", "result": result}
+    except Exception as e:
+        logger.error(f"Refinement {job_id} failed: {e}")
+        record = {"status": "failed", "error": str(e)}
+
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=REFINEMENT_DIR)
+    with os.fdopen(fd, "w") as f:
+        json.dump(record, f, default=str)
+    os.replace(tmp_path, _refinement_path(job_id, "json"))
+    try:
+        os.remove(_refinement_path(job_id, "pending"))
+    except OSError:
+        pass
+    logger.info(f"Refinement {job_id} finished: {record['status']}")
+
+
+def _prune_refinements():
+    """Drop refinement records older than REFINEMENT_TTL_SECONDS."""
+    cutoff = time.time() - REFINEMENT_TTL_SECONDS
+    for name in os.listdir(REFINEMENT_DIR):
+        path = os.path.join(REFINEMENT_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            continue
+
+
+def start_refinement(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) in the background and return a job id to poll."""
+    os.makedirs(REFINEMENT_DIR, exist_ok=True)
+    _prune_refinements()
+    job_id = uuid.uuid4().hex
+    open(_refinement_path(job_id, "pending"), "w").close()
+    _get_executor().submit(_run_refinement, job_id, fn, args, kwargs)
+    logger.info(f"Started refinement {job_id}")
+    return job_id
+
+
+def get_refinement(job_id):
+    """Status of a refinement job: running, done (with result), failed or unknown."""
+    if not re.fullmatch(r"[0-9a-f]{32}", job_id or ""):
+        return {"status": "unknown"}
+    try:
+        with open(_refinement_path(job_id, "json")) as f:
+            return json.load(f)
+    except OSError:
+        pass
+    if os.path.exists(_refinement_path(job_id, "pending")):
+        return {"status": "running"}
+    return {"status": "unknown"}
+
+
+def main(argv=None):
+    from src.compute import find_matching_files
+
+    parser = argparse.ArgumentParser(description="Build GeoTIFF overviews for a parameter so previews stay fast.")
+    parser.add_argument("parameter", help="Parameter name, e.g. 'water vapour'")
+    parser.add_argument("start_year", type=int)
+    parser.add_argument("end_year", type=int)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    files = find_matching_files(args.parameter,
+                                datetime.datetime(args.start_year, 1, 1),
+                                datetime.datetime(args.end_year, 12, 31))
+    if isinstance(files, str):
+        logger.error(files)
+        return 1
+
+    built = 0
+    for file in files:
+        try:
+            built += build_overviews(file)
+        except Exception as e:
+            logger.error(f"Failed building overviews for {file}: {e}")
+    logger.info(f"Built overviews for {built} of {len(files)} files")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import os
+import json
+import functools
+import logging
+import numpy as np
+from rasterio.features import geometry_mask
+from rasterio.windows import Window
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Named polygon regions (GeoJSON FeatureCollection, one feature per region)
+REGIONS_GEOJSON_PATH = os.path.join(os.path.dirname(__file__), "regions.geojson")
+
+
+def load_region_geometries(path=REGIONS_GEOJSON_PATH):
+    """
+    Load named polygon regions from a GeoJSON FeatureCollection.
+    Each feature needs a "name" property; names are lower-cased.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            collection = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load regions from {path}: {e}")
+        return {}
+
+    geometries = {}
+    for feature in collection.get("features", []):
+        name = (feature.get("properties") or {}).get("name")
+        if name and feature.get("geometry"):
+            geometries[name.lower()] = {"geometry": feature["geometry"]}
+    return geometries
+
+
+def region_key(region):
+    """Stable, hashable identity for a region spec (None means the whole grid)."""
+    return json.dumps(region, sort_keys=True)
+
+
+def region_geometries(region):
+    """
+    GeoJSON geometries for a region spec: either a bounding box with
+    lon_min/lon_max/lat_min/lat_max, or a dict holding a GeoJSON "geometry".
+    """
+    if "geometry" in region:
+        geometry = region["geometry"]
+        if geometry.get("type") == "GeometryCollection":
+            return list(geometry.get("geometries", []))
+        return [geometry]
+
+    lon_min, lon_max = region["lon_min"], region["lon_max"]
+    lat_min, lat_max = region["lat_min"], region["lat_max"]
+    return [{
+        "type": "Polygon",
+        "coordinates": [[[lon_min, lat_min], [lon_max, lat_min], [lon_max, lat_max],
+                         [lon_min, lat_max], [lon_min, lat_min]]]
+    }]
+
+
+def _shift_geometry(geometry, offset):
+    """Copy of a Polygon/MultiPolygon with every longitude shifted by offset degrees."""
+    def shift(coords):
+        if coords and isinstance(coords[0], (int, float)):
+            return [coords[0] + offset] + list(coords[1:])
+        return [shift(c) for c in coords]
+    return {"type": geometry["type"], "coordinates": shift(geometry["coordinates"])}
+
+
+def is_global_grid(transform, width):
+    """True when the grid's columns wrap all the way around the globe."""
+    return abs(transform.a * width) >= 359.999
+
+
+def _grid_centres(transform, width, height):
+    lons = transform.c + (np.arange(width) + 0.5) * transform.a
+    lats = transform.f + (np.arange(height) + 0.5) * transform.e
+    return lons, lats
+
+
+def _ordered_columns(col_any, wraps):
+    """
+    Full-grid column indices covered by a region, in reading order.
+    On a global grid the sequence is cut at the widest uncovered gap, so a
+    region straddling the grid's edge becomes east part followed by west part.
+    """
+    width = len(col_any)
+    covered = np.flatnonzero(col_any)
+    if not wraps or len(covered) == width:
+        return np.arange(covered[0], covered[-1] + 1)
+
+    gaps = np.diff(covered) - 1
+    wrap_gap = covered[0] + width - covered[-1] - 1
+    if len(gaps) == 0 or wrap_gap >= gaps.max():
+        return np.arange(covered[0], covered[-1] + 1)
+
+    cut = int(np.argmax(gaps))
+    return np.concatenate([np.arange(covered[cut + 1], width), np.arange(0, covered[cut] + 1)])
+
+
+def column_windows(cols):
+    """Split ordered column indices into contiguous (start, stop) runs, one read each."""
+    breaks = np.flatnonzero(np.diff(cols) != 1) + 1
+    return [(int(run[0]), int(run[-1]) + 1) for run in np.split(cols, breaks)]
+
+
+def area_weights(lats):
+    """cos(latitude) weights for rows centred on the given latitudes, shaped (rows, 1)."""
+    return np.cos(np.deg2rad(np.asarray(lats, dtype=np.float64)))[:, np.newaxis]
+
+
+def _build_plan(key, full_mask, transform, width, height):
+    if not full_mask.any():
+        return None
+
+    rows = np.flatnonzero(full_mask.any(axis=1))
+    row_start, row_end = int(rows[0]), int(rows[-1]) + 1
+    cols = _ordered_columns(full_mask.any(axis=0), is_global_grid(transform, width))
+
+    lon_centres, lat_centres = _grid_centres(transform, width, height)
+    lons = lon_centres[cols]
+    # Unwrap longitudes after the seam so stitched maps stay monotonic
+    seam = np.flatnonzero(np.diff(lons) * np.sign(transform.a) < 0)
+    if len(seam):
+        lons = lons.copy()
+        lons[seam[0] + 1:] += 360.0 * np.sign(transform.a)
+    lats = lat_centres[row_start:row_end]
+
+    windows = column_windows(cols)
+    return {
+        "key": (key, row_start, row_end, tuple(windows)),
+        "row_start": row_start,
+        "row_end": row_end,
+        "cols": cols,
+        "col_windows": windows,
+        "mask": full_mask[row_start:row_end][:, cols],
+        "lats": lats,
+        "lons": lons,
+        "area_weights": area_weights(lats),
+    }
+
+
+def _rasterize(regions, transform, width, height):
+    """Pixel mask of the union of region specs, including copies shifted by ±360°."""
+    geometries = []
+    for region in regions:
+        for geometry in region_geometries(region):
+            geometries.extend(_shift_geometry(geometry, offset) for offset in (-360.0, 0.0, 360.0))
+    return geometry_mask(geometries, out_shape=(height, width), transform=transform, invert=True)
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_plan(keys, transform, width, height):
+    regions = [json.loads(k) for k in keys]
+    if any(r is None for r in regions):
+        full_mask = np.ones((height, width), dtype=bool)
+    else:
+        full_mask = _rasterize(regions, transform, width, height)
+    plan = _build_plan("+".join(keys), full_mask, transform, width, height)
+    if plan is not None:
+        logger.debug(f"Rasterized region plan {keys}: rows {plan['row_start']}:{plan['row_end']}, "
+                     f"column windows {plan['col_windows']}")
+    return plan
+
+
+def get_region_plan(region, transform, width, height):
+    """
+    Rasterize a region once per grid and return its reading plan: the row
+    range, the column windows to read (two when it crosses the antimeridian),
+    the pixel mask and 1-D latitude/longitude axes of the stitched window, and
+    cos(lat) area weights. Returns None if the region has no pixels on the grid.
+    Plans are cached per (region, grid transform) and must not be modified.
+    """
+    return _cached_plan((region_key(region),), transform, width, height)
+
+
+def get_union_plan(regions, transform, width, height):
+    """Reading plan covering every region in the list with one set of windows."""
+    keys = tuple(sorted(region_key(r) for r in regions))
+    return _cached_plan(keys, transform, width, height)
+
+
+def plan_slices(outer, inner):
+    """
+    Row and column indexers locating the inner plan's window inside the outer
+    plan's stitched window. The inner region must be covered by the outer one.
+    The column indexer is a slice unless the outer window's seam splits the
+    inner region, in which case it is an index array.
+    """
+    positions = np.full(int(max(outer["cols"].max(), inner["cols"].max())) + 1, -1)
+    positions[outer["cols"]] = np.arange(len(outer["cols"]))
+    inner_positions = positions[inner["cols"]]
+    if np.any(inner_positions < 0):
+        raise ValueError("Inner region is not covered by the outer plan")
+
+    row_start = inner["row_start"] - outer["row_start"]
+    row_slice = slice(row_start, row_start + inner["mask"].shape[0])
+    if np.all(np.diff(inner_positions) == 1):
+        return row_slice, slice(int(inner_positions[0]), int(inner_positions[-1]) + 1)
+    return row_slice, inner_positions
+
+
+def row_block_plan(plan, row_start, row_end):
+    """
+    Plan restricted to rows [row_start, row_end) of its window, for reading a
+    region in horizontal partitions. Block plans are cheap views and are not cached.
+    """
+    block = dict(plan)
+    block.update(
+        key=(plan["key"], row_start, row_end),
+        row_start=plan["row_start"] + row_start,
+        row_end=plan["row_start"] + row_end,
+        mask=plan["mask"][row_start:row_end],
+        lats=plan["lats"][row_start:row_end],
+        area_weights=plan["area_weights"][row_start:row_end],
+    )
+    return block
+
+
+def read_plan_window(src, plan, band=1):
+    """
+    Read the plan's window from an open dataset, stitching column windows together.
+    Returns the raw band data in its native dtype and a boolean array marking
+    pixels that are nodata or masked out by the band's mask.
+    """
+    height = plan["row_end"] - plan["row_start"]
+    parts = []
+    invalid_parts = []
+    for c0, c1 in plan["col_windows"]:
+        window = Window(c0, plan["row_start"], c1 - c0, height)
+        parts.append(src.read(band, window=window))
+        invalid_parts.append(src.read_masks(band, window=window) == 0)
+    if len(parts) == 1:
+        return parts[0], invalid_parts[0]
+    return np.concatenate(parts, axis=1), np.concatenate(invalid_parts, axis=1)
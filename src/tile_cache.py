@@ -0,0 +1,181 @@
+import os
+import time
+import fcntl
+import hashlib
+import tempfile
+import logging
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cache location: tmpfs when available so entries live in shared memory and
+# every worker process on the host maps the same pages.
+_DEFAULT_CACHE_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+TILE_CACHE_DIR = os.environ.get("NICES_TILE_CACHE_DIR", os.path.join(_DEFAULT_CACHE_ROOT, "nices_tile_cache"))
+
+# Memory cap for the whole cache, shared by all workers. 0 disables caching.
+TILE_CACHE_MAX_BYTES = int(float(os.environ.get("NICES_TILE_CACHE_MB", "1024")) * 1024 * 1024)
+
+# Temporary files older than this are treated as orphaned by a killed writer
+TMP_FILE_MAX_AGE_SECONDS = 600
+
+
+def tile_cache_enabled():
+    return TILE_CACHE_MAX_BYTES > 0
+
+
+def tile_cache_key(file, *parts):
+    """
+    Build a cache key for a decoded tile.
+    The file's size and modification time are part of the key so a replaced
+    GeoTIFF never serves stale pixels.
+    """
+    stat = os.stat(file)
+    raw = "|".join([os.path.abspath(file), str(stat.st_mtime_ns), str(stat.st_size)] + [repr(p) for p in parts])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(TILE_CACHE_DIR, f"{key}.npy")
+
+
+class _CacheLock:
+    """Exclusive lock on the cache directory, shared across processes via flock."""
+
+    def __enter__(self):
+        os.makedirs(TILE_CACHE_DIR, exist_ok=True)
+        self._fh = open(os.path.join(TILE_CACHE_DIR, ".lock"), "a")
+        fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        fcntl.flock(self._fh, fcntl.LOCK_UN)
+        self._fh.close()
+        return False
+
+
+def get_cached_tile(key):
+    """
+    Return the cached tile for a key as a read-only memory map, or None on a miss.
+    """
+    if not tile_cache_enabled():
+        return None
+
+    path = _entry_path(key)
+    try:
+        data = np.load(path, mmap_mode="r")
+        # Touch the entry so eviction treats it as recently used
+        os.utime(path, None)
+    except (OSError, ValueError):
+        return None
+
+    logger.debug(f"Tile cache hit: {key}")
+    return data
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _prune_tmp_files():
+    """
+    Remove temporary files left behind by writers that died mid-write: those
+    whose process has exited or that are older than TMP_FILE_MAX_AGE_SECONDS.
+    Must be called with the cache lock held.
+    """
+    cutoff = time.time() - TMP_FILE_MAX_AGE_SECONDS
+    for name in os.listdir(TILE_CACHE_DIR):
+        if not name.startswith(".tmp-"):
+            continue
+        path = os.path.join(TILE_CACHE_DIR, name)
+        try:
+            pid = int(name.split("-")[1])
+        except (IndexError, ValueError):
+            pid = None
+        try:
+            if pid is None or not _pid_alive(pid) or os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                logger.debug(f"Removed orphaned tile cache file {name}")
+        except OSError:
+            continue
+
+
+def _evict(incoming_bytes):
+    """
+    Drop least recently used entries until the incoming entry fits under the cap.
+    Must be called with the cache lock held.
+    """
+    _prune_tmp_files()
+    entries = []
+    total = 0
+    for name in os.listdir(TILE_CACHE_DIR):
+        if name.startswith("."):
+            continue
+        path = os.path.join(TILE_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    entries.sort()
+    while entries and total + incoming_bytes > TILE_CACHE_MAX_BYTES:
+        _, size, path = entries.pop(0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+        logger.debug(f"Evicted tile cache entry {os.path.basename(path)} ({size} bytes)")
+
+    return total + incoming_bytes <= TILE_CACHE_MAX_BYTES
+
+
+def put_cached_tile(key, data):
+    """
+    Store a decoded tile and return it as a memory map backed by the cache.
+    Falls back to the given array if the tile cannot be cached.
+    """
+    if not tile_cache_enabled():
+        return data
+
+    data = np.ascontiguousarray(data)
+    if data.nbytes > TILE_CACHE_MAX_BYTES:
+        logger.debug(f"Tile of {data.nbytes} bytes exceeds cache cap; not caching")
+        return data
+
+    tmp_path = None
+    try:
+        os.makedirs(TILE_CACHE_DIR, exist_ok=True)
+        # Write outside the lock into a private file, then publish atomically
+        fd, tmp_path = tempfile.mkstemp(prefix=f".tmp-{os.getpid()}-", suffix=".npy", dir=TILE_CACHE_DIR)
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, data)
+
+        with _CacheLock():
+            if os.path.exists(_entry_path(key)):
+                # Another worker decoded the same tile first
+                os.remove(tmp_path)
+            elif _evict(data.nbytes):
+                os.rename(tmp_path, _entry_path(key))
+                logger.debug(f"Cached tile {key} ({data.nbytes} bytes)")
+            else:
+                os.remove(tmp_path)
+                return data
+    except OSError as e:
+        logger.warning(f"Could not write tile cache entry {key}: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return data
+
+    cached = get_cached_tile(key)
+    return cached if cached is not None else data
+
@@ -0,0 +1,92 @@
+import logging
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Reductions accumulate in this dtype; the data itself stays compact
+ACCUMULATOR_DTYPE = np.float64
+
+
+def band_scaling(src, band=1):
+    """
+    Scale and offset for a band, from GDAL metadata or, failing that, from
+    netCDF-style scale_factor/add_offset tags. Physical value = raw * scale + offset.
+    """
+    scale = src.scales[band - 1] if src.scales else 1.0
+    offset = src.offsets[band - 1] if src.offsets else 0.0
+    if scale == 1.0 and offset == 0.0:
+        tags = src.tags(band) or src.tags()
+        try:
+            scale = float(tags.get("scale_factor", 1.0))
+            offset = float(tags.get("add_offset", 0.0))
+        except ValueError:
+            logger.warning(f"Ignoring unparseable scale/offset tags: {tags}")
+            scale, offset = 1.0, 0.0
+    return scale, offset
+
+
+def working_dtype(dtype):
+    """
+    Smallest float dtype that represents a tile's values: float32 for int16,
+    uint16 and float32 data, float64 only for wider sources.
+    """
+    return np.promote_types(dtype, np.float32)
+
+
+def make_tile(data, invalid, scale=1.0, offset=0.0):
+    """
+    Wrap raw band data as a masked tile. Unscaled data keeps its native dtype;
+    scaled integer products are decoded to working_dtype. NaNs in float data
+    are folded into the validity mask.
+    """
+    if np.issubdtype(data.dtype, np.floating):
+        invalid = invalid | np.isnan(data)
+    if scale != 1.0 or offset != 0.0:
+        dtype = working_dtype(data.dtype)
+        data = data.astype(dtype) * dtype.type(scale) + dtype.type(offset)
+    return np.ma.MaskedArray(data, mask=invalid)
+
+
+def read_band(src, band=1, window=None):
+    """Read a band as a masked tile honouring nodata, band masks and scale/offset."""
+    data = src.read(band, window=window)
+    invalid = src.read_masks(band, window=window) == 0
+    return make_tile(data, invalid, *band_scaling(src, band))
+
+
+def valid_count(tile):
+    """Number of valid pixels in a masked tile or a NaN-marked float array."""
+    if np.ma.isMaskedArray(tile):
+        return int(tile.count())
+    return int(np.sum(~np.isnan(tile)))
+
+
+def tile_to_float(tile):
+    """Float copy of a tile in its working dtype, with invalid pixels set to NaN."""
+    if not np.ma.isMaskedArray(tile):
+        return np.asarray(tile)
+    out = np.ma.getdata(tile).astype(working_dtype(tile.dtype))
+    out[np.ma.getmaskarray(tile)] = np.nan
+    return out
+
+
+def stack_tiles(tiles):
+    """
+    Stack a list of tiles into one (days, rows, cols) cube in the narrowest
+    working dtype, filling it in place so no float64 copy of the data is made.
+    Each list entry is released once it has been copied, so the tiles and the
+    cube are never both held in full; the list is left holding None.
+    """
+    dtype = np.result_type(*[working_dtype(tile.dtype) for tile in tiles])
+    cube = np.empty((len(tiles),) + tiles[0].shape, dtype=dtype)
+    for i in range(len(tiles)):
+        tile = tiles[i]
+        tiles[i] = None
+        if np.ma.isMaskedArray(tile):
+            cube[i] = np.ma.getdata(tile)
+            cube[i][np.ma.getmaskarray(tile)] = np.nan
+        else:
+            cube[i] = tile
+        del tile
+    return cube
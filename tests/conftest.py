@@ -0,0 +1,50 @@
+import os
+import datetime
+import tempfile
+import numpy as np
+import pytest
+
+# Keep the shared tile cache, admission ledger and refinement files out of /dev/shm
+_STATE_DIR = tempfile.mkdtemp(prefix="nices-tests-")
+os.environ.setdefault("NICES_TILE_CACHE_DIR", os.path.join(_STATE_DIR, "tiles"))
+os.environ.setdefault("NICES_ADMISSION_LEDGER", os.path.join(_STATE_DIR, "admission.json"))
+os.environ.setdefault("NICES_REFINEMENT_DIR", os.path.join(_STATE_DIR, "refinements"))
+
+rasterio = pytest.importorskip("rasterio")
+from rasterio.transform import from_origin
+
+N_DAYS = 12
+START_DATE = datetime.date(2011, 1, 1)
+
+
+def write_day(path, raw, nodata=-9999, scale=0.1):
+    """Write one day of a 1-degree global int16 grid with scale and nodata metadata."""
+    with rasterio.open(path, "w", driver="GTiff", width=raw.shape[1], height=raw.shape[0], count=1, dtype="int16",
+                       crs="EPSG:4326", transform=from_origin(-180, 90, 1, 1), nodata=nodata) as dst:
+        dst.write(raw, 1)
+        dst.scales = (scale,)
+        dst.offsets = (0.0,)
+
+
+@pytest.fixture(scope="session")
+def dataset(tmp_path_factory):
+    """
+    A small water vapour dataset laid out like the real one: N_DAYS daily
+    GeoTIFFs with nodata rows and scattered nodata pixels. Returns the dataset
+    root, the sorted file paths and the decoded (days, 180, 360) float cube.
+    """
+    root = tmp_path_factory.mktemp("datasets")
+    year_dir = root / "water_vapour" / str(START_DATE.year)
+    year_dir.mkdir(parents=True)
+    rng = np.random.default_rng(7)
+    files, days = [], []
+    for d in range(N_DAYS):
+        date = START_DATE + datetime.timedelta(days=d)
+        raw = rng.integers(0, 500, size=(180, 360)).astype("int16")
+        raw[:5, :] = -9999
+        raw[rng.random((180, 360)) < 0.05] = -9999
+        path = year_dir / f"wv_{date:%Y%m%d}.tif"
+        write_day(path, raw)
+        files.append(str(path))
+        days.append(np.where(raw == -9999, np.nan, raw * 0.1))
+    return str(root), files, np.stack(days)
@@ -0,0 +1,74 @@
+import functools
+import rasterio
+import numpy as np
+import pytest
+
+pytest.importorskip("rarfile")
+from src import compute
+from src.compute import read_planned_tile, get_region_plan, read_union_tiles, compute_region_statistics
+
+WRAP_BOX = {"lon_min": 150, "lon_max": 200, "lat_min": -10, "lat_max": 10}
+
+
+def numpy_window(day, box):
+    """Reference window for a box on the 1-degree global grid, walking east from lon_min across the seam."""
+    lats = 90 - np.arange(180) - 0.5
+    rows = np.flatnonzero((lats >= box["lat_min"]) & (lats <= box["lat_max"]))
+    # Longitudes start on the grid's [-180, 180) range and keep increasing past the seam
+    west = (np.floor(box["lon_min"]) + 180) % 360 - 180
+    lons = west + np.arange(np.ceil(box["lon_max"]) - np.floor(box["lon_min"])) + 0.5
+    cols = np.floor(lons + 180).astype(int) % 360
+    return day[rows][:, cols], lats[rows], lons
+
+
+@pytest.mark.parametrize("box", [WRAP_BOX, {"lon_min": -200, "lon_max": -170, "lat_min": 30, "lat_max": 45},
+                                 {"lon_min": 40, "lon_max": 100, "lat_min": -30, "lat_max": 30}])
+def test_stitched_window_matches_numpy(dataset, box):
+    _, files, days = dataset
+    tile, plan = read_planned_tile(files[0], functools.partial(get_region_plan, box))
+    expected, lats, lons = numpy_window(days[0], box)
+
+    np.testing.assert_allclose(plan["lats"], lats)
+    np.testing.assert_allclose(plan["lons"], lons)
+    np.testing.assert_array_equal(np.ma.getmaskarray(tile), np.isnan(expected))
+    np.testing.assert_allclose(tile.filled(np.nan), expected, rtol=1e-6)
+
+
+def test_wrapping_region_mean_matches_numpy(dataset):
+    _, files, days = dataset
+    tiles, _, _, _ = compute.read_tiles(files, functools.partial(get_region_plan, WRAP_BOX))
+    result = compute.compute_statistic(tiles, "mean")
+    expected = np.nanmean([numpy_window(day, WRAP_BOX)[0] for day in days])
+    assert result["scalar"] == pytest.approx(expected, rel=1e-6)
+
+
+@pytest.mark.parametrize("operation", ["mean", "median", "max", "deviation"])
+def test_union_read_matches_single_regions(dataset, operation):
+    _, files, _ = dataset
+    regions = compute.resolve_regions(["indian ocean", "pacific ocean", {"name": "wrap", **WRAP_BOX}])
+    stacked, _, union_plan, grid = read_union_tiles(files, regions.values())
+    stats = compute_region_statistics(stacked, union_plan, grid, regions, operation)
+
+    for name, spec in regions.items():
+        tiles, _, _, _ = compute.read_tiles(files, functools.partial(get_region_plan, spec))
+        single = compute.compute_statistic(tiles, operation, return_daily=True, return_spatial=True)
+        assert stats[name]["scalar"] == pytest.approx(single["scalar"], rel=1e-6)
+        np.testing.assert_allclose(stats[name]["daily"], single["trend"][1], rtol=1e-6)
+        np.testing.assert_allclose(stats[name]["spatial"], single["spatial"], rtol=1e-6)
+
+
+def test_region_operations_share_one_read(dataset, monkeypatch):
+    root, files, _ = dataset
+    monkeypatch.setattr(compute, "DATASET_PATHS", root)
+    time_range = ["2011-01-01", "2011-01-12"]
+    reads = []
+    real_read = compute.read_planned_tile
+    monkeypatch.setattr(compute, "read_planned_tile", lambda *args, **kwargs: reads.append(args[0]) or real_read(*args, **kwargs))
+
+    result = compute.perform_region_operations(["mean", "range"], "water vapour", time_range, ["indian ocean", "arabian sea"])
+    assert sorted(reads) == sorted(files)
+    for operation in ["mean", "range"]:
+        for location in ["indian ocean", "arabian sea"]:
+            single = compute.perform_operation(operation, "water vapour", time_range, location,
+                                               with_trend=False, with_spatial=False)
+            assert result["results"][operation][location]["value"] == pytest.approx(single["value"], rel=1e-6)
@@ -0,0 +1,104 @@
+import functools
+import numpy as np
+import pytest
+
+pytest.importorskip("rarfile")
+from src import compute
+from src.planner import IN_MEMORY, STREAMING, PARTITIONED, estimate_query, choose_strategy
+
+OPERATIONS = ["mean", "median", "variance", "max", "min", "range", "deviation"]
+STREAMABLE = [op for op in OPERATIONS if op != "median"]
+
+
+@pytest.fixture(params=["indian ocean", "pacific ocean"])
+def make_plan(request):
+    return functools.partial(compute.get_region_plan, compute.get_region(request.param))
+
+
+def in_memory(files, make_plan, operation):
+    tiles, dates, _, _ = compute.read_tiles(files, make_plan)
+    return compute.compute_statistic(tiles, operation, return_daily=True, return_spatial=True, dates=dates, consume=True)
+
+
+def assert_same_result(result, reference, rtol=1e-6):
+    assert result["scalar"] == pytest.approx(reference["scalar"], rel=rtol)
+    assert result["trend"][0] == reference["trend"][0]
+    np.testing.assert_allclose(result["trend"][1], reference["trend"][1], rtol=rtol)
+    np.testing.assert_allclose(result["spatial"], reference["spatial"], rtol=rtol)
+
+
+@pytest.mark.parametrize("operation", STREAMABLE)
+def test_streaming_matches_in_memory(dataset, make_plan, operation):
+    _, files, _ = dataset
+    result, _, _ = compute.compute_statistic_streaming(files, make_plan, operation, return_daily=True, return_spatial=True)
+    assert_same_result(result, in_memory(files, make_plan, operation))
+
+
+@pytest.mark.parametrize("operation", STREAMABLE)
+@pytest.mark.parametrize("partitions", [2, 7])
+def test_partitioned_matches_in_memory(dataset, make_plan, operation, partitions):
+    _, files, _ = dataset
+    result, _, _ = compute.compute_statistic_partitioned(files, make_plan, operation, partitions,
+                                                         return_daily=True, return_spatial=True)
+    assert_same_result(result, in_memory(files, make_plan, operation))
+
+
+def test_partitioned_median_within_one_bin(dataset, make_plan):
+    _, files, _ = dataset
+    reference = in_memory(files, make_plan, "median")
+    result, _, _ = compute.compute_statistic_partitioned(files, make_plan, "median", 3, return_daily=True,
+                                                         return_spatial=True, median_bins=4096)
+    # The scalar median comes from a histogram; maps and daily values are exact
+    assert result["scalar"] == pytest.approx(reference["scalar"], abs=50.0 / 4096)
+    np.testing.assert_allclose(result["spatial"], reference["spatial"])
+    np.testing.assert_allclose(result["trend"][1], reference["trend"][1])
+
+
+@pytest.mark.parametrize("operation", OPERATIONS)
+def test_in_memory_matches_numpy(dataset, operation):
+    _, files, days = dataset
+    plan_fn = functools.partial(compute.get_region_plan, compute.get_region("indian ocean"))
+    tiles, _, lats, lons = compute.read_tiles(files, plan_fn)
+    result = compute.compute_statistic(tiles, operation)
+
+    # Cells whose centres fall in the box, straight from the decoded cube
+    box = compute.LOCATION_COORDS["indian ocean"]
+    all_lons = -180 + np.arange(360) + 0.5
+    all_lats = 90 - np.arange(180) - 0.5
+    rows = (all_lats >= box["lat_min"]) & (all_lats <= box["lat_max"])
+    cols = (all_lons >= box["lon_min"]) & (all_lons <= box["lon_max"])
+    values = days[:, rows][:, :, cols]
+    expected = {"mean": np.nanmean, "median": np.nanmedian, "max": np.nanmax, "min": np.nanmin,
+                "variance": np.nanvar, "range": lambda a: np.nanmax(a) - np.nanmin(a), "deviation": np.nanstd}[operation]
+    np.testing.assert_allclose(lats, all_lats[rows])
+    np.testing.assert_allclose(lons, all_lons[cols])
+    assert result["scalar"] == pytest.approx(expected(values), rel=1e-5, abs=1e-5)
+
+
+@pytest.mark.parametrize("strategy", [IN_MEMORY, STREAMING, PARTITIONED])
+def test_planner_strategies_agree_end_to_end(dataset, make_plan, monkeypatch, strategy):
+    _, files, _ = dataset
+    estimate = compute.plan_query(files, make_plan, "variance", budget=float("inf"))
+    budget = {
+        IN_MEMORY: estimate["in_memory_bytes"],
+        STREAMING: estimate["streaming_bytes"],
+        PARTITIONED: min(estimate["streaming_bytes"] - 1, estimate["in_memory_bytes"] // 3),
+    }[strategy]
+    real_plan_query = compute.plan_query
+    chosen = []
+
+    def plan_query(*args, **kwargs):
+        planned = real_plan_query(*args, **dict(kwargs, budget=budget))
+        chosen.append(planned["strategy"])
+        return planned
+
+    monkeypatch.setattr(compute, "plan_query", plan_query)
+    result, _, _ = compute.execute_query(files, make_plan, "variance", return_daily=True, return_spatial=True)
+    assert chosen == [strategy]
+    assert_same_result(result, in_memory(files, make_plan, "variance"))
+
+
+def test_median_never_streams():
+    estimate = estimate_query(100, (400, 400), "int16", "median", scaled=True)
+    choose_strategy(estimate, budget=estimate["streaming_bytes"] + 1)
+    assert estimate["strategy"] == PARTITIONED